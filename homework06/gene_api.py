@@ -11,11 +11,29 @@ logging.basicConfig(level=logging.INFO)
 # HGNC Data source URL (JSON format)
 DATA_URL = "https://storage.googleapis.com/public-download-files/hgnc/json/json/hgnc_complete_set.json"
 
+# Number of genes written per pipelined round trip
+LOAD_CHUNK_SIZE = 1000
+# COUNT hint passed to each SCAN call when walking the gene keys
+SCAN_COUNT = 1000
+
 def get_redis_client():
     return redis.Redis(host="redis-db", port=6379, db=0)
 
 rd = get_redis_client()
 
+def scan_keys(pattern="gene:*", count=SCAN_COUNT):
+    """
+    Yields batches of keys matching pattern, one batch per SCAN call.
+    Used instead of KEYS so Redis is never blocked for the whole keyspace.
+    """
+    cursor = 0
+    while True:
+        cursor, keys = rd.scan(cursor=cursor, match=pattern, count=count)
+        if keys:
+            yield keys
+        if cursor == 0:
+            break
+
 
 def fetch_hgnc_data(url=DATA_URL):
     """
@@ -44,26 +62,43 @@ def fetch_hgnc_data(url=DATA_URL):
         logging.error("Error fetching HGNC data: %s", e)
         return []
 
-def load_data_to_redis(data):
+def _flush_chunk(pipe, keys):
+    """
+    Executes a pipelined chunk of SET commands.
+    Returns the number of keys that were stored successfully.
+    """
+    results = pipe.execute(raise_on_error=False)
+    errors = [(key, res) for key, res in zip(keys, results) if isinstance(res, redis.exceptions.ResponseError)]
+    if errors:
+        logging.error("Redis rejected %d of %d keys in chunk (first %s: %s)",
+                      len(errors), len(keys), errors[0][0], errors[0][1])
+    return len(keys) - len(errors)
+
+def load_data_to_redis(data, chunk_size=LOAD_CHUNK_SIZE):
     """
     Loads gene data into Redis.
+    Genes are sent through a non-transactional pipeline in chunks of chunk_size.
     """
     count = 0
+    pipe = rd.pipeline(transaction=False)
+    keys = []
     for gene in data:
         # Ensure the item is a dictionary
         if isinstance(gene, dict):
             hgnc_id = gene.get("hgnc_id")
             if hgnc_id:
                 key = "gene:" + hgnc_id
-                try:
-                    rd.set(key, json.dumps(gene))
-                    count += 1
-                except redis.exceptions.ResponseError as re:
-                    logging.error("Redis ResponseError for key %s: %s", key, re)
+                pipe.set(key, json.dumps(gene))
+                keys.append(key)
+                if len(keys) >= chunk_size:
+                    count += _flush_chunk(pipe, keys)
+                    keys = []
             else:
                 logging.warning("Skipping gene without 'hgnc_id': %s", gene)
         else:
             logging.warning("Skipping non-dictionary item: %s", gene)
+    if keys:
+        count += _flush_chunk(pipe, keys)
     logging.info("Loaded %d genes into Redis.", count)
     return count
 
@@ -83,12 +118,15 @@ def get_data():
     Retrieves all gene data from Redis and returns it as a JSON list.
     """
     try:
-        keys = rd.keys("gene:*")
+        seen = set()
         genes = []
-        for key in keys:
-            gene_data = rd.get(key)
-            if gene_data:
-                genes.append(json.loads(gene_data))
+        for keys in scan_keys():
+            # SCAN may return a key twice, so skip ones already fetched
+            keys = [key for key in keys if key not in seen]
+            seen.update(keys)
+            for gene_data in rd.mget(keys):
+                if gene_data:
+                    genes.append(json.loads(gene_data))
         return json.dumps(genes), 200
     except Exception as e:
         logging.error("Error retrieving gene data: %s", e)
@@ -101,9 +139,8 @@ def delete_data():
     Deletes all gene data from Redis.
     """
     try:
-        keys = rd.keys("gene:*")
-        if keys:
-            rd.delete(*keys)
+        for keys in scan_keys():
+            rd.unlink(*keys)
         response = "Deleted gene data from Redis"
         return json.dumps(response), 200
     except Exception as e:
@@ -117,9 +154,11 @@ def list_genes():
     Returns a JSON-formatted list of all hgnc_id values stored in Redis.
     """
     try:
-        keys = rd.keys("gene:*")
-        gene_ids = [key.decode("utf-8").replace("gene:", "") for key in keys]
-        return json.dumps(gene_ids), 200
+        gene_ids = {}
+        for keys in scan_keys():
+            for key in keys:
+                gene_ids[key.decode("utf-8").replace("gene:", "")] = None
+        return json.dumps(list(gene_ids)), 200
     except Exception as e:
         logging.error("Error listing gene IDs: %s", e)
         response = {"error": str(e)}
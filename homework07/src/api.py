@@ -13,6 +13,9 @@ logging.basicConfig(level=logging.INFO)
 # HGNC data source URL
 DATA_URL = "https://storage.googleapis.com/public-download-files/hgnc/json/json/hgnc_complete_set.json"
 
+# COUNT hint passed to each SCAN call when walking the gene keys
+SCAN_COUNT = int(os.environ.get("SCAN_COUNT", "1000"))
+
 def get_redis_client():
     """Return a Redis client instance using environment variables."""
     redis_ip = os.environ.get("REDIS_IP", "redis-db")
@@ -21,6 +24,16 @@ def get_redis_client():
 
 rd = get_redis_client()
 
+def scan_keys(pattern="gene:*", count=SCAN_COUNT):
+    """Yield batches of keys matching pattern using SCAN instead of a blocking KEYS."""
+    cursor = 0
+    while True:
+        cursor, keys = rd.scan(cursor=cursor, match=pattern, count=count)
+        if keys:
+            yield keys
+        if cursor == 0:
+            break
+
 def fetch_hgnc_data(url=DATA_URL):
     """Fetch HGNC data from the remote source."""
     try:
@@ -60,8 +73,12 @@ def post_data():
 def get_data():
     """Retrieve all gene data stored in Redis."""
     try:
-        keys = rd.keys("gene:*")
-        genes = [json.loads(rd.get(key)) for key in keys if rd.get(key)]
+        seen = set()
+        genes = []
+        for keys in scan_keys():
+            keys = [key for key in keys if key not in seen]
+            seen.update(keys)
+            genes.extend(json.loads(value) for value in rd.mget(keys) if value)
         return json.dumps(genes, indent=2), 200
     except Exception as e:
         logging.error("Error retrieving gene data: %s", e)
@@ -71,9 +88,8 @@ def get_data():
 def delete_data():
     """Delete all gene data from Redis."""
     try:
-        keys = rd.keys("gene:*")
-        if keys:
-            rd.delete(*keys)
+        for keys in scan_keys():
+            rd.unlink(*keys)
         return json.dumps("Deleted gene data from Redis", indent=2), 200
     except Exception as e:
         logging.error("Error deleting gene data: %s", e)
@@ -83,9 +99,10 @@ def delete_data():
 def list_genes():
     """List all gene IDs."""
     try:
-        keys = rd.keys("gene:*")
-        gene_ids = [key.decode("utf-8").replace("gene:", "") for key in keys]
-        return json.dumps(gene_ids, indent=2), 200
+        gene_ids = {}
+        for keys in scan_keys():
+            gene_ids.update(dict.fromkeys(key.decode("utf-8").replace("gene:", "") for key in keys))
+        return json.dumps(list(gene_ids), indent=2), 200
     except Exception as e:
         logging.error("Error listing gene IDs: %s", e)
         return json.dumps({"error": str(e)}, indent=2), 500
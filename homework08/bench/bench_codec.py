@@ -0,0 +1,55 @@
+"""
+Report bytes per gene for each storage codec, the encode/decode cost of each, and the cost of
+the API and worker read paths over stored records: GET /data (to_json_bytes) and a worker batch
+(decode_genes, JOB_BATCH_SIZE records at a time).
+
+    PYTHONPATH=src python bench/bench_codec.py --genes 5000
+    PYTHONPATH=src python bench/bench_codec.py --source hgnc_complete_set.json
+--source reads real records from a local HGNC download; otherwise synthetic records are used.
+"""
+import argparse
+import itertools
+import time
+from bench_load import make_genes
+from codec import decode_gene, decode_genes, encode_gene, to_json_bytes
+
+CODECS = ("json", "zlib", "msgpack+zlib")
+# Records per decode_genes call, as fetched by one worker MGET
+BATCH_SIZE = 500
+
+def rate(n: int, func) -> float:
+    """Return how many records per second func() gets through, for n records."""
+    start = time.perf_counter()
+    func()
+    return n / (time.perf_counter() - start)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--genes", type=int, default=5000)
+    parser.add_argument("--source", help="local HGNC JSON file to read genes from")
+    args = parser.parse_args()
+
+    if args.source:
+        from api import fetch_hgnc_data
+        genes = list(itertools.islice(fetch_hgnc_data(args.source), args.genes))
+    else:
+        genes = make_genes(args.genes)
+
+    print(f"genes: {len(genes)}  source: {args.source or 'synthetic'}")
+    baseline = None
+    for codec in CODECS:
+        start = time.perf_counter()
+        encoded = [encode_gene(gene, codec) for gene in genes]
+        encode_time = time.perf_counter() - start
+        decode_rate = rate(len(genes), lambda: [decode_gene(value) for value in encoded])
+        json_rate = rate(len(genes), lambda: [to_json_bytes(value) for value in encoded])
+        batch_rate = rate(len(genes), lambda: [decode_genes(encoded[i:i + BATCH_SIZE])
+                                               for i in range(0, len(encoded), BATCH_SIZE)])
+        per_gene = sum(map(len, encoded)) / len(genes)
+        baseline = baseline or per_gene
+        print(f"{codec:14}: {per_gene:8.1f} bytes/gene ({per_gene / baseline:6.1%} of json)"
+              f"  encode {len(genes) / encode_time:9.0f}/s  decode {decode_rate:9.0f}/s"
+              f"  GET /data {json_rate:10.0f}/s  worker batch {batch_rate:9.0f}/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark the gene loader: one SET per gene vs. the pipelined load_data_to_redis.
+
+Runs against fakeredis so no Redis container is needed:
+    PYTHONPATH=src python bench/bench_load.py --genes 20000
+Pass --tcp to serve fakeredis over a local socket, which adds a real round trip per command.
+"""
+import argparse
+import json
+import threading
+import time
+import fakeredis
+import redis
+import api
+
+def make_genes(n: int) -> list:
+    """Build n synthetic HGNC-like gene records."""
+    return [
+        {
+            "hgnc_id": f"HGNC:{i}",
+            "symbol": f"GENE{i}",
+            "name": f"synthetic gene {i}",
+            "locus_group": "protein-coding gene",
+            "status": "Approved",
+            "location": f"{i % 22 + 1}q{i % 40}.{i % 9}",
+            "date_approved_reserved": f"{1986 + i % 38}-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            "alias_symbol": [f"ALIAS{i}a", f"ALIAS{i}b"],
+            "gene_group": ["Synthetic genes"],
+        }
+        for i in range(1, n + 1)
+    ]
+
+def load_per_key(client: redis.Redis, genes: list) -> int:
+    """The original loader: one SET round trip per gene."""
+    count = 0
+    for gene in genes:
+        client.set("gene:" + gene["hgnc_id"], json.dumps(gene))
+        count += 1
+    return count
+
+def get_client(tcp: bool) -> redis.Redis:
+    """Return an in-process fakeredis client, or one talking to a fakeredis TCP server."""
+    if not tcp:
+        return fakeredis.FakeRedis()
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return redis.Redis(host=host, port=port)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--genes", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=api.LOAD_CHUNK_SIZE)
+    parser.add_argument("--tcp", action="store_true")
+    args = parser.parse_args()
+
+    genes = make_genes(args.genes)
+    api.rd = get_client(args.tcp)
+
+    api.rd.flushdb()
+    start = time.perf_counter()
+    load_per_key(api.rd, genes)
+    per_key = time.perf_counter() - start
+
+    api.rd.flushdb()
+    start = time.perf_counter()
+    api.load_data_to_redis(genes, chunk_size=args.chunk_size)
+    pipelined = time.perf_counter() - start
+
+    print(f"genes: {args.genes}  chunk size: {args.chunk_size}  transport: {'tcp' if args.tcp else 'in-process'}")
+    print(f"per-key SET : {args.genes / per_key:10.0f} records/sec ({per_key:.3f}s)")
+    print(f"pipelined   : {args.genes / pipelined:10.0f} records/sec ({pipelined:.3f}s)")
+    print(f"speedup     : {per_key / pipelined:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Micro-benchmark parse_date: the original strptime loop vs. the fast-path, LRU-cached parser.
+
+    PYTHONPATH=src python bench/bench_parse_date.py --dates 200000
+Dates are drawn from a pool of --distinct values in both HGNC formats, since approval dates repeat heavily.
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+import dates as date_parsing
+
+def parse_date_strptime(date_str: str) -> datetime:
+    """The original parse_date: try strptime with each format."""
+    date_str = date_str.strip()
+    for fmt in ("%m/%d/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"cannot parse date '{date_str}'")
+
+def make_dates(n: int, distinct: int) -> list:
+    """Build n date strings drawn from `distinct` days between 1986 and 2024, half in each format."""
+    rng = random.Random(332)
+    start = date(1986, 1, 1)
+    days = [start + timedelta(days=rng.randrange(365 * 38)) for _ in range(distinct)]
+    pool = [f"{d.month}/{d.day}/{d.year}" for d in days[::2]] + [d.isoformat() for d in days[1::2]]
+    return [rng.choice(pool) for _ in range(n)]
+
+def time_parser(parse, dates: list) -> float:
+    """Return the seconds taken to parse every date string."""
+    start = time.perf_counter()
+    for date_str in dates:
+        parse(date_str)
+    return time.perf_counter() - start
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dates", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=5000)
+    args = parser.parse_args()
+
+    dates = make_dates(args.dates, args.distinct)
+    assert all(parse_date_strptime(d) == date_parsing.parse_date(d) for d in dates[:1000])
+
+    date_parsing._parse_date.cache_clear()
+    results = {
+        "strptime loop": time_parser(parse_date_strptime, dates),
+        "fast path, no cache": time_parser(date_parsing._parse_date.__wrapped__, [d.strip() for d in dates]),
+        "fast path + LRU": time_parser(date_parsing.parse_date, dates),
+    }
+    print(f"dates: {args.dates}  distinct: {args.distinct}  cache size: {date_parsing.PARSE_DATE_CACHE_SIZE}")
+    baseline = results["strptime loop"]
+    for name, elapsed in results.items():
+        print(f"{name:20}: {args.dates / elapsed:12.0f} dates/sec ({baseline / elapsed:.1f}x)")
+
+if __name__ == "__main__":
+    main()
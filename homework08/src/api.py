@@ -1,11 +1,27 @@
+import hashlib
+import itertools
 import json
 import logging
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Iterator
+import ijson
 import requests
 import redis
-from flask import Flask, request
-from jobs import add_job, get_job_by_id, get_results
+import urllib3
+from flask import Flask, Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from metrics import GENE_CACHE_LOOKUPS, HTTP_REQUEST_DURATION, instrument_redis, metrics_registry
+from profiling import start_profile, finish_profile, get_profile, new_request_id
+from jobs import (q, rdb, add_job, dataset_version, add_completed_job, normalize_analysis, get_job_by_id, get_results, get_results_etag,
+                  list_job_ids, job_events, wait_for_job, GENE_INDEX_KEY, GENE_DATES_KEY, DATASET_VERSION_KEY, JOB_STATUSES,
+                  FINAL_STATUSES, DEFAULT_ANALYSIS)
+from date_index import DATE_INDEX_KEY, build_date_index, get_date_index
+from codec import GENE_CODEC, decode_gene, decode_genes, encode_gene, to_json_bytes
+from dates import parse_date, finalize_summary
 
 app = Flask(__name__)
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
@@ -13,63 +29,426 @@ logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
 # HGNC data source URL
 DATA_URL = "https://storage.googleapis.com/public-download-files/hgnc/json/json/hgnc_complete_set.json"
 
+# Where POST /data reads genes from: an HTTP(S) URL or a local file path
+DATA_SOURCE = os.environ.get("HGNC_DATA_SOURCE", DATA_URL)
+
+# Seconds to wait for the HGNC download to connect, and then for each read of its body
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", "30"))
+# Number of genes written per pipelined round trip when loading data
+LOAD_CHUNK_SIZE = int(os.environ.get("LOAD_CHUNK_SIZE", "1000"))
+# COUNT hint passed to each SCAN call when walking the gene keys
+SCAN_COUNT = int(os.environ.get("SCAN_COUNT", "1000"))
+# Seconds between keep-alive comments on an idle job event stream
+SSE_KEEPALIVE = float(os.environ.get("SSE_KEEPALIVE", "15"))
+# Longest a ?wait= request may hold its connection open, in seconds
+MAX_JOB_WAIT = float(os.environ.get("MAX_JOB_WAIT", "60"))
+# Number of serialized GET /genes/<hgnc_id> responses kept in memory
+GENE_CACHE_SIZE = int(os.environ.get("GENE_CACHE_SIZE", "4096"))
+
 def get_redis_client() -> redis.Redis:
     """Return a Redis client for the gene data (db=0)."""
     redis_ip = os.environ.get("REDIS_IP", "redis-db")
     redis_port = int(os.environ.get("REDIS_PORT", "6379"))
-    return redis.Redis(host=redis_ip, port=redis_port, db=0)
+    return instrument_redis(redis.Redis(host=redis_ip, port=redis_port, db=0))
 
 rd = get_redis_client()
+registry = metrics_registry(q)
+
+@app.before_request
+def _start_timer() -> None:
+    """Note when the request started, for the latency histogram."""
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _observe_latency(response: Response) -> Response:
+    """
+    Record the request's latency by route template, method and status.
+    For streamed responses this is the time until the first chunk is ready.
+    """
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUEST_DURATION.labels(route, request.method, str(response.status_code)).observe(
+        time.perf_counter() - g.request_start)
+    return response
+
+# Views whose responses stream, possibly for hours; they are never profiled
+_STREAMED_ENDPOINTS = ("get_data", "stream_job_events")
+
+@app.before_request
+def _start_profile() -> None:
+    """Profile the request if it asks with an X-Profile header or ?profile=true and profiling allows it."""
+    if request.endpoint in _STREAMED_ENDPOINTS:
+        return
+    requested = (request.headers.get("X-Profile", "") or request.args.get("profile", "")).lower() in ("1", "true", "yes")
+    g.profiler = start_profile(requested)
+
+@app.after_request
+def _attach_profile(response: Response) -> Response:
+    """Give a profiled response an X-Request-ID naming its profile."""
+    if g.get("profiler") is not None:
+        g.request_id = new_request_id()
+        g.response_status = response.status_code
+        response.headers["X-Request-ID"] = g.request_id
+    return response
+
+@app.teardown_request
+def _finish_profile(error: BaseException = None) -> None:
+    """
+    Stop and store the request's profile. Teardown runs even when an exception skipped
+    after_request, so the profiler is always stopped and its lock released.
+    """
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return
+    request_id = g.get("request_id") or new_request_id()
+    status = g.get("response_status", "error" if error else "?")
+    description = f"{request.method} {request.full_path.rstrip('?')} -> {status}"
+    try:
+        finish_profile(profiler, rdb, request_id, description, time.perf_counter() - g.request_start)
+    except Exception as e:
+        logging.error("Error storing profile %s: %s", request_id, e)
+
+@app.route("/profiles/<request_id>", methods=["GET"])
+def get_request_profile(request_id: str):
+    """
+    Return the profile of a request as a text report, or with ?format=pstats as raw
+    pstats data for tools such as snakeviz.
+    """
+    raw = request.args.get("format") == "pstats"
+    profile = get_profile(rdb, request_id, "pstats" if raw else "report")
+    if profile is None:
+        return json.dumps({"error": f"No profile found for request {request_id}"}, indent=2), 404
+    if raw:
+        return profile, 200, {"Content-Type": "application/octet-stream"}
+    return profile, 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Expose API metrics in the Prometheus text format."""
+    return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+
+# LRU cache of serialized gene responses keyed by (dataset version, hgnc_id)
+_gene_cache = OrderedDict()
+_gene_cache_lock = threading.Lock()
+
+def bump_dataset_version() -> str:
+    """Mark the gene data as changed, invalidating cached responses in every API replica."""
+    return str(rd.incr(DATASET_VERSION_KEY))
+
+def _dataset_etag(version: str) -> str:
+    """Return the ETag for a gene representation: the dataset version plus the path and query parameters."""
+    resource = request.path.encode("utf-8") + b"?" + request.query_string
+    return f"genes-{version}-{hashlib.sha1(resource).hexdigest()[:12]}"
+
+def _not_modified(etag: str, exists=None) -> tuple:
+    """
+    Return a 304 response if the client already holds this ETag, otherwise None.
+    If-None-Match: * matches any current representation, so for a resource that may be
+    missing pass exists, a callable saying whether it is there.
+    """
+    if request.if_none_match.star_tag and exists is not None and not exists():
+        return None
+    if request.if_none_match.contains(etag):
+        return "", 304, {"ETag": f'"{etag}"'}
+    return None
+
+def _cache_get(key: tuple) -> str:
+    """Return the cached response for key, or None, and count the hit or miss."""
+    with _gene_cache_lock:
+        body = _gene_cache.get(key)
+        if body is None:
+            GENE_CACHE_LOOKUPS.labels("miss").inc()
+            return None
+        _gene_cache.move_to_end(key)
+        GENE_CACHE_LOOKUPS.labels("hit").inc()
+        return body
 
-def fetch_hgnc_data(url: str = DATA_URL) -> list:
-    """Fetch HGNC gene data from the remote JSON source."""
-    try:
-        res = requests.get(url)
-        res.raise_for_status()
-        data = res.json()
-        if isinstance(data, dict) and "response" in data and "docs" in data["response"]:
-            return data["response"]["docs"]
-        return data
-    except requests.exceptions.RequestException as e:
-        logging.error("Error fetching HGNC data: %s", e)
-        return []
-
-def load_data_to_redis(data: list) -> int:
-    """Store the HGNC gene data in Redis and return the number of genes loaded."""
+def _cache_put(key: tuple, body: str) -> None:
+    """Store a response, evicting the least recently used one when the cache is full."""
+    with _gene_cache_lock:
+        _gene_cache[key] = body
+        _gene_cache.move_to_end(key)
+        while len(_gene_cache) > GENE_CACHE_SIZE:
+            _gene_cache.popitem(last=False)
+
+def scan_keys(pattern: str = "gene:*", count: int = SCAN_COUNT) -> Iterator[list]:
+    """
+    Yield batches of keys matching pattern, one batch per SCAN call.
+    Unlike KEYS this never blocks Redis for the whole keyspace. A key may be
+    returned more than once if Redis rehashes during the walk.
+    """
+    cursor = 0
+    while True:
+        cursor, keys = rd.scan(cursor=cursor, match=pattern, count=count)
+        if keys:
+            yield keys
+        if cursor == 0:
+            break
+
+def _iter_docs(stream) -> Iterator[dict]:
+    """
+    Incrementally parse gene records out of a binary JSON stream.
+    HGNC wraps them in {"response": {"docs": [...]}}, but a bare JSON list is accepted too.
+    """
+    events = ijson.parse(stream, use_float=True)
+    first = next(events, None)
+    if first is None:
+        return
+    prefix = "item" if first[1] == "start_array" else "response.docs.item"
+    yield from ijson.items(itertools.chain([first], events), prefix)
+
+def fetch_hgnc_data(source: str = DATA_SOURCE) -> Iterator[dict]:
+    """
+    Stream HGNC gene records one at a time from a URL or a local file path.
+    The JSON is parsed incrementally, so memory use does not grow with the dataset size.
+    A download that fails to connect, drops or times out mid-body, or ends in truncated
+    JSON is logged and ends the stream after the records parsed so far.
+    """
+    fetched = 0
+    try:
+        if source.startswith(("http://", "https://")):
+            with requests.get(source, stream=True, timeout=FETCH_TIMEOUT) as res:
+                res.raise_for_status()
+                res.raw.decode_content = True
+                for doc in _iter_docs(res.raw):
+                    fetched += 1
+                    yield doc
+        else:
+            with open(source, "rb") as stream:
+                for doc in _iter_docs(stream):
+                    fetched += 1
+                    yield doc
+    except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, ijson.JSONError) as e:
+        # res.raw is read directly, so errors mid-body come from urllib3 and ijson, not requests
+        logging.error("Error fetching HGNC data after %d genes: %s", fetched, e)
+
+def _approval_ordinal(gene: dict) -> int:
+    """Return the gene's approval date as a date ordinal, or None if it is missing or unparseable."""
+    date_str = gene.get("date_approved_reserved")
+    if not isinstance(date_str, str) or not date_str.strip():
+        return None
+    try:
+        return parse_date(date_str).toordinal()
+    except ValueError:
+        logging.warning("Not indexing approval date '%s' of %s", date_str, gene["hgnc_id"])
+        return None
+
+def _flush_chunk(pipe: redis.client.Pipeline, keys: list, index: dict, dates: dict, undated: list) -> int:
+    """
+    Queue the chunk's index updates, execute the pipeline and return how many genes were stored.
+    Genes in undated have no valid approval date, so any ordinal left from an earlier load is removed.
+    Failed commands are logged and counted instead of aborting the load.
+    """
+    if index:
+        pipe.zadd(GENE_INDEX_KEY, index)
+    if dates:
+        pipe.hset(GENE_DATES_KEY, mapping=dates)
+    if undated:
+        pipe.hdel(GENE_DATES_KEY, *undated)
+    results = pipe.execute(raise_on_error=False)
+    errors = [(key, res) for key, res in zip(keys, results) if isinstance(res, redis.exceptions.ResponseError)]
+    if errors:
+        logging.error("Redis rejected %d of %d keys in chunk (first %s: %s)",
+                      len(errors), len(keys), errors[0][0], errors[0][1])
+    for res in results[len(keys):]:
+        if isinstance(res, redis.exceptions.ResponseError):
+            logging.error("Failed to update gene indexes for chunk: %s", res)
+    return len(keys) - len(errors)
+
+def _publish_load() -> str:
+    """
+    Bump the dataset version after genes were written, so cached responses and ETags are
+    invalidated, and rebuild the approval date range index for it. Returns the new version.
+    """
+    version = bump_dataset_version()
+    try:
+        build_date_index(rd, version)
+    except redis.exceptions.RedisError as e:
+        logging.error("Failed to build the approval date range index, jobs will scan instead: %s", e)
+    return version
+
+def load_data_to_redis(data: Iterable[dict], chunk_size: int = LOAD_CHUNK_SIZE) -> int:
+    """
+    Store the HGNC gene data in Redis and return the number of genes loaded.
+    Genes are written through a non-transactional pipeline, one round trip per chunk_size genes.
+    Each gene is also added to the HGNC number index and the approval date column used by jobs.
+    data may be any iterable, so a streamed download is written as it is parsed.
+    Afterwards the approval date range index is rebuilt for the new dataset version; that also
+    happens when the load fails after writing some genes, so no replica keeps serving the old data.
+    """
     count = 0
+    chunks = 0
+    total = 0
+    stored_bytes = 0
+    written = False
+    loaded = False
     try:
+        pipe = rd.pipeline(transaction=False)
+        keys = []
+        index = {}
+        dates = {}
+        undated = []
         for gene in data:
             if isinstance(gene, dict) and "hgnc_id" in gene:
-                key = "gene:" + gene["hgnc_id"]
+                hgnc_id = gene["hgnc_id"]
+                key = "gene:" + hgnc_id
+                value = encode_gene(gene)
+                pipe.set(key, value)
+                stored_bytes += len(value)
+                keys.append(key)
                 try:
-                    rd.set(key, json.dumps(gene))
-                    count += 1
-                except redis.exceptions.ResponseError as re_err:
-                    logging.error("Redis ResponseError for key %s: %s", key, re_err)
+                    index[hgnc_id] = int(hgnc_id.split(":")[1])
+                except (IndexError, ValueError):
+                    logging.warning("Not indexing gene with non-numeric id %s", hgnc_id)
+                ordinal = _approval_ordinal(gene)
+                if ordinal is not None:
+                    dates[hgnc_id] = ordinal
+                else:
+                    undated.append(hgnc_id)
+                total += 1
+                if len(keys) >= chunk_size:
+                    written = True
+                    count += _flush_chunk(pipe, keys, index, dates, undated)
+                    chunks += 1
+                    keys = []
+                    index = {}
+                    dates = {}
+                    undated = []
+        if keys:
+            written = True
+            count += _flush_chunk(pipe, keys, index, dates, undated)
+            chunks += 1
+        loaded = True
     except redis.exceptions.ConnectionError as conn_err:
         logging.error("Redis connection failed: %s", conn_err)
         raise Exception("Failed to connect to Redis")
-    logging.info("Loaded %d genes into Redis.", count)
+    finally:
+        if not loaded and written:
+            try:
+                version = _publish_load()
+                logging.warning("Load failed after storing %d genes in %d chunks, dataset version %s.",
+                                count, chunks, version)
+            except redis.exceptions.RedisError as e:
+                logging.error("Failed to invalidate the partially loaded data: %s", e)
+    version = _publish_load()
+    logging.info("Loaded %d genes into Redis in %d chunks (%d failed), dataset version %s.",
+                 count, chunks, total - count, version)
+    if total:
+        logging.info("Stored genes with codec %s: %.0f bytes per gene.", GENE_CODEC, stored_bytes / total)
     return count
 
 @app.route("/data", methods=["POST"])
 def post_data():
-    """Load gene data from the HGNC source into Redis."""
+    """Stream gene data from the HGNC source into Redis."""
     try:
-        data = fetch_hgnc_data()
-        count = load_data_to_redis(data)
+        count = load_data_to_redis(fetch_hgnc_data())
         return {"message": f"Loaded {count} genes into Redis"}, 201
     except Exception as e:
         logging.error("Error loading data: %s", e)
         return {"error": str(e)}, 500
 
+def _page_params() -> tuple:
+    """
+    Parse the optional cursor, limit and fields query parameters.
+    Returns (cursor, limit, fields); raises ValueError if a parameter is malformed.
+    """
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit")
+    fields = request.args.get("fields")
+    if cursor is not None:
+        if not cursor.isdigit():
+            raise ValueError("cursor must be a non-negative integer")
+        cursor = int(cursor)
+    if limit is not None:
+        if not limit.isdigit() or int(limit) == 0:
+            raise ValueError("limit must be a positive integer")
+        limit = int(limit)
+    if fields is not None:
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+    return cursor, limit, fields
+
+def _index_page(cursor: int, limit: int) -> tuple:
+    """
+    Return one page of HGNC IDs in numeric order from the gene index, plus the cursor of the next page.
+    The cursor is the HGNC number of the last ID returned; the next cursor is None on the last page.
+    """
+    start = "-inf" if cursor is None else f"({cursor}"
+    if limit is None:
+        members = rd.zrangebyscore(GENE_INDEX_KEY, start, "+inf", withscores=True)
+    else:
+        members = rd.zrangebyscore(GENE_INDEX_KEY, start, "+inf", start=0, num=limit, withscores=True)
+    gene_ids = [member.decode("utf-8") for member, _ in members]
+    next_cursor = str(int(members[-1][1])) if limit is not None and len(members) == limit else None
+    return gene_ids, next_cursor
+
+def _gene_batches(batch_size: int = SCAN_COUNT) -> Iterator[list]:
+    """
+    Yield every stored gene record in HGNC number order, batch_size at a time: one page of the
+    gene index and one MGET per batch. Index pages never repeat a gene, so memory stays O(batch_size).
+    """
+    cursor = None
+    while True:
+        gene_ids, cursor = _index_page(None if cursor is None else int(cursor), batch_size)
+        if gene_ids:
+            yield from _gene_batches_for_ids(gene_ids, batch_size)
+        if cursor is None:
+            break
+
+def _gene_batches_for_ids(gene_ids: list, batch_size: int = SCAN_COUNT) -> Iterator[list]:
+    """Yield the stored records for the given HGNC IDs, one MGET per batch_size IDs."""
+    for i in range(0, len(gene_ids), batch_size):
+        yield [value for value in rd.mget(["gene:" + gid for gid in gene_ids[i:i + batch_size]]) if value]
+
+def _project(values: list, fields: list) -> list:
+    """Decode a batch of stored genes and keep only the requested fields of each."""
+    genes = decode_genes(values)
+    return [{field: gene[field] for field in fields if field in gene} for gene in genes]
+
+def _json_array(batches: Iterable[list]) -> Iterator[bytes]:
+    """Stream already-serialized JSON values as one JSON array, one chunk per batch."""
+    yield b"["
+    first = True
+    for values in batches:
+        if not values:
+            continue
+        yield (b"" if first else b",") + b",".join(values)
+        first = False
+    yield b"]"
+
 @app.route("/data", methods=["GET"])
 def get_data():
-    """Retrieve all gene data stored in Redis."""
+    """
+    Stream all gene data stored in Redis as a JSON array in HGNC number order, one Redis batch at a time.
+    Plain JSON records are sent as stored; only codec-encoded records are decoded and re-encoded.
+    With ?limit=&cursor= a page is returned in HGNC number order and the X-Next-Cursor header
+    points at the next one; ?fields=symbol,name returns only those attributes of each gene.
+    """
     try:
-        keys = rd.keys("gene:*")
-        genes = [json.loads(rd.get(key)) for key in keys if rd.get(key)]
-        return json.dumps(genes, indent=2), 200
+        cursor, limit, fields = _page_params()
+    except ValueError as e:
+        return json.dumps({"error": str(e)}, indent=2), 400
+
+    try:
+        etag = _dataset_etag(dataset_version(rd))
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+        next_cursor = None
+        if cursor is None and limit is None:
+            batches = _gene_batches()
+        else:
+            gene_ids, next_cursor = _index_page(cursor, limit)
+            batches = _gene_batches_for_ids(gene_ids)
+        if fields:
+            batches = ([json.dumps(gene).encode() for gene in _project(values, fields)] for values in batches if values)
+        else:
+            batches = ([to_json_bytes(value) for value in values] for values in batches)
+        # Pull the first batch now so Redis errors still produce a 500 before streaming starts
+        first = next(batches, [])
+        response = Response(_json_array(itertools.chain([first], batches)), mimetype="application/json")
+        response.set_etag(etag)
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
     except Exception as e:
         logging.error("Error retrieving gene data: %s", e)
         return json.dumps({"error": str(e)}), 500
@@ -78,9 +457,10 @@ def get_data():
 def delete_data():
     """Delete all gene data stored in Redis."""
     try:
-        keys = rd.keys("gene:*")
-        if keys:
-            rd.delete(*keys)
+        for keys in scan_keys():
+            rd.unlink(*keys)
+        rd.unlink(GENE_INDEX_KEY, GENE_DATES_KEY, DATE_INDEX_KEY)
+        bump_dataset_version()
         return json.dumps("Deleted gene data from Redis", indent=2), 200
     except Exception as e:
         logging.error("Error deleting gene data: %s", e)
@@ -88,24 +468,66 @@ def delete_data():
 
 @app.route("/genes", methods=["GET"])
 def list_genes():
-    """Return a list of all HGNC gene IDs stored in Redis."""
+    """
+    Return a list of all HGNC gene IDs stored in Redis.
+    Supports the same limit, cursor and fields parameters as GET /data; with fields,
+    each entry is an object holding hgnc_id and the requested attributes.
+    """
+    try:
+        cursor, limit, fields = _page_params()
+    except ValueError as e:
+        return json.dumps({"error": str(e)}, indent=2), 400
+
     try:
-        keys = rd.keys("gene:*")
-        gene_ids = [key.decode("utf-8").replace("gene:", "") for key in keys]
-        return json.dumps(gene_ids, indent=2), 200
+        etag = _dataset_etag(dataset_version(rd))
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+        headers = {"ETag": f'"{etag}"'}
+        if cursor is None and limit is None:
+            gene_ids = {}
+            for keys in scan_keys():
+                gene_ids.update(dict.fromkeys(key.decode("utf-8").replace("gene:", "") for key in keys))
+            gene_ids = list(gene_ids)
+        else:
+            gene_ids, next_cursor = _index_page(cursor, limit)
+            if next_cursor is not None:
+                headers["X-Next-Cursor"] = next_cursor
+        if fields:
+            fields = ["hgnc_id"] + [field for field in fields if field != "hgnc_id"]
+            genes = []
+            for values in _gene_batches_for_ids(gene_ids):
+                if values:
+                    genes.extend(_project(values, fields))
+            return json.dumps(genes, indent=2), 200, headers
+        return json.dumps(gene_ids, indent=2), 200, headers
     except Exception as e:
         logging.error("Error listing gene IDs: %s", e)
         return json.dumps({"error": str(e)}, indent=2), 500
 
 @app.route("/genes/<hgnc_id>", methods=["GET"])
 def get_gene(hgnc_id: str):
-    """Return detailed information for a specific gene."""
+    """
+    Return detailed information for a specific gene.
+    Serialized responses are cached in memory until the dataset version changes.
+    """
     try:
+        version = dataset_version(rd)
+        etag = _dataset_etag(version)
+        not_modified = _not_modified(etag, lambda: rd.exists("gene:" + hgnc_id))
+        if not_modified:
+            return not_modified
+        cache_key = (version, hgnc_id)
+        body = _cache_get(cache_key)
+        if body is not None:
+            return body, 200, {"X-Cache": "HIT", "ETag": f'"{etag}"'}
         key = "gene:" + hgnc_id
         gene_data = rd.get(key)
         if gene_data is None:
             return json.dumps({"error": f"No gene found with id {hgnc_id}"}, indent=2), 404
-        return json.dumps(json.loads(gene_data), indent=2), 200
+        body = json.dumps(decode_gene(gene_data), indent=2)
+        _cache_put(cache_key, body)
+        return body, 200, {"X-Cache": "MISS", "ETag": f'"{etag}"'}
     except Exception as e:
         logging.error("Error retrieving gene %s: %s", hgnc_id, e)
         return json.dumps({"error": str(e)}, indent=2), 500
@@ -114,7 +536,9 @@ def get_gene(hgnc_id: str):
 def create_job():
     """
     Create a new job to analyze the gene approval dates in a given range.
-    Expects JSON with 'hgnc_id_start' and 'hgnc_id_end' (e.g., "HGNC:6", "HGNC:12345").
+    Expects JSON with 'hgnc_id_start' and 'hgnc_id_end' (e.g., "HGNC:6", "HGNC:12345"), and optionally
+    an 'analysis' such as {"field": "locus_group", "aggregation": "top_k", "k": 5} to run instead.
+    With ?sync=true and the range index built, the job is answered immediately instead of queued.
     """
     if not request.is_json:
         return json.dumps({"error": "Content-Type must be application/json"}, indent=2), 400
@@ -131,7 +555,18 @@ def create_job():
         return json.dumps({"error": "Invalid HGNC ID format. Use HGNC:<number> (e.g., HGNC:5)."}, indent=2), 400
 
     try:
-        job = add_job(start, end)
+        analysis = normalize_analysis(job_params.get("analysis"))
+    except ValueError as e:
+        return json.dumps({"error": str(e)}, indent=2), 400
+
+    try:
+        sync = request.args.get("sync", "").lower() in ("1", "true", "yes") and analysis == DEFAULT_ANALYSIS
+        index = get_date_index(rd) if sync else None
+        if index:
+            summary = index.summarize(int(start.split(":")[1]), int(end.split(":")[1]))
+            job = add_completed_job(start, end, json.dumps(finalize_summary(summary), indent=2, sort_keys=True))
+        else:
+            job = add_job(start, end, analysis=analysis)
         return json.dumps(job, indent=2), 201
     except Exception as e:
         logging.error("Error submitting job: %s", e)
@@ -139,21 +574,65 @@ def create_job():
 
 @app.route("/jobs", methods=["GET"])
 def list_jobs():
-    """Return a list of all submitted job IDs."""
+    """
+    Return submitted job IDs, oldest first, from the job indexes.
+    ?status=complete lists only jobs currently in that status; ?limit=&cursor= pages through
+    them, with the X-Next-Cursor header pointing at the next page.
+    """
+    status = request.args.get("status")
+    cursor = request.args.get("cursor")
+    limit = request.args.get("limit")
+    if status is not None and status not in JOB_STATUSES:
+        return json.dumps({"error": f"status must be one of: {', '.join(JOB_STATUSES)}"}, indent=2), 400
+    if limit is not None:
+        if not limit.isdigit() or int(limit) == 0:
+            return json.dumps({"error": "limit must be a positive integer"}, indent=2), 400
+        limit = int(limit)
+    if cursor is not None:
+        try:
+            finite = -float("inf") < float(cursor) < float("inf")
+        except ValueError:
+            finite = False
+        if not finite:
+            return json.dumps({"error": "cursor must be a number"}, indent=2), 400
+
     try:
-        from jobs import jdb
-        keys = jdb.keys("*")
-        job_ids = [key.decode("utf-8") for key in keys]
-        return json.dumps({"jobs": job_ids}, indent=2), 200
+        job_ids, next_cursor = list_job_ids(status, cursor, limit)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else {}
+        return json.dumps({"jobs": job_ids}, indent=2), 200, headers
     except Exception as e:
         logging.error("Error listing jobs: %s", e)
         return json.dumps({"error": str(e)}, indent=2), 500
 
+def _wait_param() -> float:
+    """
+    Parse the optional ?wait= query parameter: seconds to wait for a job to complete, capped at MAX_JOB_WAIT.
+    Returns 0 when it is absent; raises ValueError if it is malformed.
+    """
+    wait = request.args.get("wait")
+    if wait is None:
+        return 0
+    try:
+        wait = float(wait)
+    except ValueError:
+        raise ValueError("wait must be a number of seconds") from None
+    if not 0 <= wait < float("inf"):
+        raise ValueError("wait must be a number of seconds")
+    return min(wait, MAX_JOB_WAIT)
+
 @app.route("/jobs/<jid>", methods=["GET"])
 def get_job_info(jid: str):
-    """Return the status and information for a specific job."""
+    """
+    Return the status and information for a specific job.
+    With ?wait=<seconds> an unfinished job is returned as soon as it completes, or when the wait runs out.
+    """
+    try:
+        wait = _wait_param()
+    except ValueError as e:
+        return json.dumps({"error": str(e)}, indent=2), 400
+
     try:
-        job = get_job_by_id(jid)
+        job = wait_for_job(jid, wait) if wait else get_job_by_id(jid)
         if not job:
             return json.dumps({"error": f"No job found with id {jid}"}, indent=2), 404
         return json.dumps(job, indent=2), 200
@@ -161,25 +640,69 @@ def get_job_info(jid: str):
         logging.error("Error retrieving job %s: %s", jid, e)
         return json.dumps({"error": str(e)}, indent=2), 500
 
+@app.route("/jobs/<jid>/events", methods=["GET"])
+def stream_job_events(jid: str):
+    """
+    Stream a job's status and progress as server-sent events until it completes or fails.
+    The first event is the whole job; later ones carry the status or processed/total counts.
+    """
+    try:
+        if not get_job_by_id(jid):
+            return json.dumps({"error": f"No job found with id {jid}"}, indent=2), 404
+    except Exception as e:
+        logging.error("Error retrieving job %s: %s", jid, e)
+        return json.dumps({"error": str(e)}, indent=2), 500
+
+    def events() -> Iterator[str]:
+        for event in job_events(jid, SSE_KEEPALIVE):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"data: {json.dumps(event)}\n\n"
+
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.route("/results/<jid>", methods=["GET"])
 def get_job_results(jid: str):
     """
     Return the analysis results for a completed job, which consist of a yearly breakdown of gene approval dates.
-    If the job is not complete, it returns a message indicating so.
+    If the job is not complete, it returns a message indicating so; if it failed, its error.
+    Completed results carry an ETag, so a matching If-None-Match returns 304 without reading the job.
+    With ?wait=<seconds> the request is held until the job completes or the wait runs out.
     """
+    try:
+        wait = _wait_param()
+    except ValueError as e:
+        return json.dumps({"error": str(e)}, indent=2), 400
+
+    etag = get_results_etag(jid)
+    if etag:
+        not_modified = _not_modified(etag)
+        if not_modified:
+            return not_modified
+
     job = get_job_by_id(jid)
+    if job and job["status"] not in FINAL_STATUSES and wait:
+        job = wait_for_job(jid, wait)
+        etag = get_results_etag(jid)
     if not job:
         return json.dumps({"error": f"No job found with id {jid}"}, indent=2), 404
 
+    if job["status"] == "failed":
+        return json.dumps({"error": f"Job failed: {job.get('error', 'unknown error')}"}, indent=2), 500
+
     if job["status"] != "complete":
-        return json.dumps({"message": "Job not complete yet. Please try again later."}, indent=2), 202
+        pending = {"message": "Job not complete yet. Please try again later."}
+        pending.update({key: job[key] for key in ("processed", "total", "partial_results") if key in job})
+        return json.dumps(pending, indent=2), 202
 
     results = get_results(jid)
     if not results:
         return json.dumps({"error": "No results found for this job."}, indent=2), 500
 
     try:
-        return json.dumps(json.loads(results), indent=2), 200
+        headers = {"ETag": f'"{etag}"'} if etag else {}
+        return json.dumps(json.loads(results), indent=2), 200, headers
     except Exception as e:
         return json.dumps({"error": str(e)}, indent=2), 500
 
@@ -0,0 +1,49 @@
+import json
+import os
+import zlib
+import msgpack
+
+# Codec used for newly written gene records: "json", "zlib" or "msgpack+zlib".
+# JSON is the default because the read paths pass it through or decode it in bulk;
+# the compressed codecs trade read speed for memory (see bench/bench_codec.py)
+GENE_CODEC = os.environ.get("GENE_CODEC", "json")
+ZLIB_LEVEL = int(os.environ.get("GENE_ZLIB_LEVEL", "6"))
+
+# Format-version markers written as the first byte of encoded records.
+# Plain JSON records have no marker; they always start with "{".
+ZLIB_JSON = b"\x01"
+ZLIB_MSGPACK = b"\x02"
+
+def encode_gene(gene: dict, codec: str = GENE_CODEC) -> bytes:
+    """Serialize a gene record for storage in Redis using the given codec."""
+    if codec == "json":
+        return json.dumps(gene).encode("utf-8")
+    if codec == "zlib":
+        return ZLIB_JSON + zlib.compress(json.dumps(gene).encode("utf-8"), ZLIB_LEVEL)
+    if codec == "msgpack+zlib":
+        return ZLIB_MSGPACK + zlib.compress(msgpack.packb(gene), ZLIB_LEVEL)
+    raise ValueError(f"unknown gene codec '{codec}'")
+
+def decode_gene(data: bytes) -> dict:
+    """Deserialize a stored gene record, whichever codec wrote it."""
+    marker = data[:1]
+    if marker == ZLIB_MSGPACK:
+        return msgpack.unpackb(zlib.decompress(data[1:]), raw=False)
+    if marker == ZLIB_JSON:
+        return json.loads(zlib.decompress(data[1:]))
+    return json.loads(data)
+
+def decode_genes(values: list) -> list:
+    """
+    Deserialize a batch of stored gene records.
+    A batch of plain JSON records is decoded with a single json.loads call.
+    """
+    if all(value[:1] == b"{" for value in values):
+        return json.loads(b"[" + b",".join(values) + b"]")
+    return [decode_gene(value) for value in values]
+
+def to_json_bytes(data: bytes) -> bytes:
+    """Return a stored gene record as JSON bytes, passing plain JSON records through untouched."""
+    if data[:1] == b"{":
+        return data
+    return json.dumps(decode_gene(data)).encode("utf-8")
@@ -0,0 +1,140 @@
+import logging
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+import redis
+from jobs import GENE_DATES_KEY, dataset_version
+
+# Hash in the gene DB holding the range index over the approval date column, as packed little-endian
+# int32 arrays (so an index built on one architecture reads correctly on any other):
+#   "version"   dataset version the index was built from
+#   "numbers"   HGNC numbers of the genes with an approval date, ascending
+#   "year:<y>"  positions (into "numbers") of the genes approved in year y, ascending
+#   "min:<k>"   sparse table level k: earliest ordinal among positions [i, i + 2**k)
+#   "max:<k>"   sparse table level k: latest ordinal among positions [i, i + 2**k)
+DATE_INDEX_KEY = "genes:date_index"
+
+def _pack(values) -> bytes:
+    """Pack integers as a little-endian int32 array."""
+    values = array("i", values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def _unpack(data: bytes) -> array:
+    """Unpack a little-endian int32 array written by _pack."""
+    values = array("i")
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def _sparse_table(values: list, pick) -> list:
+    """Return the levels of a sparse table answering pick() over any range of values."""
+    levels = [values]
+    width = 1
+    while 2 * width <= len(values):
+        prev = levels[-1]
+        levels.append([pick(prev[i], prev[i + width]) for i in range(len(prev) - width)])
+        width *= 2
+    return levels
+
+def index_fields(genes: list, version: str) -> dict:
+    """Return the DATE_INDEX_KEY hash fields for (HGNC number, approval ordinal) pairs sorted by number."""
+    ordinals = [ordinal for _, ordinal in genes]
+    fields = {"version": version, "numbers": _pack(number for number, _ in genes)}
+    positions = {}
+    for position, ordinal in enumerate(ordinals):
+        positions.setdefault(date.fromordinal(ordinal).year, []).append(position)
+    for year, year_positions in positions.items():
+        fields[f"year:{year}"] = _pack(year_positions)
+    for k, level in enumerate(_sparse_table(ordinals, min)):
+        fields[f"min:{k}"] = _pack(level)
+    for k, level in enumerate(_sparse_table(ordinals, max)):
+        fields[f"max:{k}"] = _pack(level)
+    return fields
+
+def build_date_index(rd: redis.Redis, version: str) -> int:
+    """
+    Rebuild the range index from the approval date column and store it under DATE_INDEX_KEY.
+    Returns the number of genes indexed; with an empty column the index is removed instead.
+    """
+    genes = []
+    for hgnc_id, ordinal in rd.hgetall(GENE_DATES_KEY).items():
+        try:
+            genes.append((int(hgnc_id.split(b":")[1]), int(ordinal)))
+        except (IndexError, ValueError):
+            continue
+    if not genes:
+        rd.delete(DATE_INDEX_KEY)
+        return 0
+    genes.sort()
+    pipe = rd.pipeline()
+    pipe.delete(DATE_INDEX_KEY)
+    pipe.hset(DATE_INDEX_KEY, mapping=index_fields(genes, version))
+    pipe.execute()
+    logging.info("Built approval date range index over %d genes for dataset version %s.", len(genes), version)
+    return len(genes)
+
+class DateIndex:
+    """In-memory copy of the range index; answers a range query in time independent of its width."""
+
+    def __init__(self, fields: dict):
+        self.version = fields[b"version"].decode("utf-8")
+        self.numbers = _unpack(fields[b"numbers"])
+        self.years = {}
+        self.mins = {}
+        self.maxes = {}
+        for field, data in fields.items():
+            kind, _, arg = field.decode("utf-8").partition(":")
+            if kind == "year":
+                self.years[int(arg)] = _unpack(data)
+            elif kind == "min":
+                self.mins[int(arg)] = _unpack(data)
+            elif kind == "max":
+                self.maxes[int(arg)] = _unpack(data)
+
+    def summarize(self, start_num: int, end_num: int) -> dict:
+        """
+        Return the partial summary (count, earliest and latest ordinals, yearly breakdown)
+        of the genes numbered start_num to end_num, in O(years * log N).
+        """
+        lo = bisect_left(self.numbers, start_num)
+        hi = bisect_right(self.numbers, end_num)
+        if lo >= hi:
+            return {"total_genes": 0, "earliest_ordinal": None, "latest_ordinal": None, "yearly_breakdown": {}}
+        yearly_breakdown = {}
+        for year, positions in self.years.items():
+            n = bisect_left(positions, hi) - bisect_left(positions, lo)
+            if n:
+                yearly_breakdown[year] = n
+        k = (hi - lo).bit_length() - 1
+        return {
+            "total_genes": hi - lo,
+            "earliest_ordinal": min(self.mins[k][lo], self.mins[k][hi - (1 << k)]),
+            "latest_ordinal": max(self.maxes[k][lo], self.maxes[k][hi - (1 << k)]),
+            "yearly_breakdown": yearly_breakdown
+        }
+
+_cached = None
+_cached_lock = threading.Lock()
+
+def get_date_index(rd: redis.Redis) -> DateIndex:
+    """
+    Return the range index for the current dataset version, or None if it has not been built for it.
+    The index is read from Redis once per version and kept in memory.
+    """
+    global _cached
+    version = dataset_version(rd)
+    with _cached_lock:
+        if _cached is not None and _cached.version == version:
+            return _cached
+    fields = rd.hgetall(DATE_INDEX_KEY)
+    if not fields or fields[b"version"].decode("utf-8") != version:
+        return None
+    index = DateIndex(fields)
+    with _cached_lock:
+        _cached = index
+    return index
@@ -0,0 +1,96 @@
+import os
+from collections import Counter
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Iterable
+
+# Number of distinct date strings remembered by parse_date
+PARSE_DATE_CACHE_SIZE = int(os.environ.get("PARSE_DATE_CACHE_SIZE", "16384"))
+
+def _split_date(date_str: str, sep: str) -> tuple:
+    """Split a date string into three digit-only parts, or raise ValueError."""
+    parts = date_str.split(sep)
+    if len(parts) != 3 or not all(part.isascii() and part.isdigit() for part in parts):
+        raise ValueError
+    return parts
+
+@lru_cache(maxsize=PARSE_DATE_CACHE_SIZE)
+def _parse_date(date_str: str) -> datetime:
+    """Parse an already stripped "m/d/yyyy" or "YYYY-MM-DD" string without strptime."""
+    try:
+        if "/" in date_str:
+            month, day, year = _split_date(date_str, "/")
+            if len(month) > 2 or len(day) > 2 or len(year) != 4:
+                raise ValueError
+        else:
+            year, month, day = _split_date(date_str, "-")
+            if len(year) != 4 or len(month) > 2 or len(day) > 2:
+                raise ValueError
+        return datetime(int(year), int(month), int(day))
+    except ValueError:
+        raise ValueError(f"cannot parse date '{date_str}'") from None
+
+def parse_date(date_str: str) -> datetime:
+    """
+    Parse a date string using either "m/d/yyyy" or "YYYY-MM-DD" format.
+    Approval dates repeat heavily, so results are kept in a bounded LRU cache.
+    """
+    return _parse_date(date_str.strip())
+
+def partial_summary(ordinals: Iterable[int]) -> dict:
+    """
+    Compute a mergeable summary of approval date ordinals: total count,
+    earliest and latest ordinals, and a yearly breakdown.
+    """
+    counts = Counter(ordinals)
+    yearly_breakdown = {}
+    for ordinal, n in counts.items():
+        year = date.fromordinal(ordinal).year
+        yearly_breakdown[year] = yearly_breakdown.get(year, 0) + n
+    return {
+        "total_genes": sum(counts.values()),
+        "earliest_ordinal": min(counts) if counts else None,
+        "latest_ordinal": max(counts) if counts else None,
+        "yearly_breakdown": yearly_breakdown
+    }
+
+def merge_summaries(partials: Iterable[dict]) -> dict:
+    """
+    Combine partial summaries into one. Yearly counts are added and the extreme ordinals kept;
+    year keys may be strings when the partials were read back from JSON.
+    """
+    total = 0
+    earliest = []
+    latest = []
+    yearly_breakdown = {}
+    for partial in partials:
+        total += partial["total_genes"]
+        if partial["earliest_ordinal"] is not None:
+            earliest.append(partial["earliest_ordinal"])
+            latest.append(partial["latest_ordinal"])
+        for year, n in partial["yearly_breakdown"].items():
+            yearly_breakdown[int(year)] = yearly_breakdown.get(int(year), 0) + n
+    return {
+        "total_genes": total,
+        "earliest_ordinal": min(earliest) if earliest else None,
+        "latest_ordinal": max(latest) if latest else None,
+        "yearly_breakdown": yearly_breakdown
+    }
+
+def finalize_summary(summary: dict) -> dict:
+    """Turn a partial summary into the job result, formatting the earliest and latest dates."""
+    if not summary["total_genes"]:
+        return {"error": "No valid dates found in the specified range."}
+    return {
+        "total_genes": summary["total_genes"],
+        "earliest_date": date.fromordinal(summary["earliest_ordinal"]).strftime("%m/%d/%Y"),
+        "latest_date": date.fromordinal(summary["latest_ordinal"]).strftime("%m/%d/%Y"),
+        "yearly_breakdown": summary["yearly_breakdown"]
+    }
+
+def summarize_dates(ordinals: Iterable[int]) -> dict:
+    """
+    Compute the job summary from approval date ordinals:
+    total count, earliest and latest dates, and a yearly breakdown.
+    """
+    return finalize_summary(partial_summary(ordinals))
@@ -1,71 +1,535 @@
 import os
 import json
+import hashlib
+import time
 import uuid
+from datetime import datetime, timezone
+from typing import Iterator
 import redis
 from hotqueue import HotQueue
+from reliable_queue import ReliableQueue
+from metrics import instrument_redis
 
 _redis_ip = os.environ.get("REDIS_IP", "redis-db")
 _redis_port = int(os.environ.get("REDIS_PORT", "6379"))
 
-rd = redis.Redis(host=_redis_ip, port=_redis_port, db=0) # Gene data
-q = HotQueue("queue", host=_redis_ip, port=_redis_port, db=1) # Queue
-jdb = redis.Redis(host=_redis_ip, port=_redis_port, db=2) # Jobs DB
-rdb = redis.Redis(host=_redis_ip, port=_redis_port, db=3) # Results DB
+# "simple" pops job IDs off the queue; "reliable" tracks them until acknowledged (see reliable_queue.py)
+QUEUE_MODE = os.environ.get("QUEUE_MODE", "simple")
+# Seconds a reliable-queue consumer may go without a heartbeat before its jobs are requeued
+QUEUE_VISIBILITY_TIMEOUT = int(os.environ.get("QUEUE_VISIBILITY_TIMEOUT", "60"))
+
+rd = instrument_redis(redis.Redis(host=_redis_ip, port=_redis_port, db=0)) # Gene data
+if QUEUE_MODE == "reliable":
+    q = ReliableQueue("queue", visibility_timeout=QUEUE_VISIBILITY_TIMEOUT, host=_redis_ip, port=_redis_port, db=1) # Queue
+else:
+    q = HotQueue("queue", host=_redis_ip, port=_redis_port, db=1) # Queue
+jdb = instrument_redis(redis.Redis(host=_redis_ip, port=_redis_port, db=2)) # Jobs DB
+rdb = instrument_redis(redis.Redis(host=_redis_ip, port=_redis_port, db=3)) # Results DB
+
+# Seconds an identical job request is answered by an existing job for the same dataset version (0 disables)
+JOB_CACHE_TTL = int(os.environ.get("JOB_CACHE_TTL", "86400"))
+# Seconds an unfinished job may go without a status change or progress update and still be reused
+JOB_STALL_TIMEOUT = int(os.environ.get("JOB_STALL_TIMEOUT", "600"))
+# Seconds jobs, their results and their index entries are kept after submission (0 keeps them forever)
+JOB_TTL = int(os.environ.get("JOB_TTL", str(7 * 86400)))
+# Ranges wider than this many HGNC numbers are split into independently queued shards (0 disables)
+JOB_SHARD_SIZE = int(os.environ.get("JOB_SHARD_SIZE", "0"))
+
+# Sorted set in the gene DB: member "HGNC:<number>", score <number>
+GENE_INDEX_KEY = "genes:index"
+# Hash in the gene DB: field "HGNC:<number>", value the gene's approval date as a date ordinal
+GENE_DATES_KEY = "genes:approved"
+# Counter in the gene DB, bumped whenever the gene data is reloaded or deleted
+DATASET_VERSION_KEY = "genes:version"
+
+# Sorted set in the jobs DB: member job ID, score submission time (epoch seconds); shard jobs are not listed
+JOBS_INDEX_KEY = "jobs:submitted"
+# Statuses a job moves through; each has a sorted set "jobs:status:<status>" of the listed jobs in it,
+# also scored by submission time
+JOB_STATUSES = ("submitted", "in progress", "complete", "failed")
+# Statuses a job never leaves once it has reached them
+FINAL_STATUSES = ("complete", "failed")
+
+# Aggregations a job can run over a gene field
+AGGREGATIONS = ("count_by", "top_k", "date_histogram")
+# Analysis run by jobs that do not specify one: the yearly histogram of approval dates
+DEFAULT_ANALYSIS = {"field": "date_approved_reserved", "aggregation": "date_histogram"}
+# Number of values a top_k analysis returns unless the job asks for another k
+DEFAULT_TOP_K = 10
+
+# Job fields stored as integers or as JSON; everything else in a job hash is a string
+_INT_FIELDS = ("shard", "shards", "processed", "total")
+_JSON_FIELDS = ("partial_results", "analysis")
+# Timestamp field set the first time a job enters each status
+STATUS_TIMESTAMPS = {"in progress": "started_at", "complete": "finished_at", "failed": "finished_at"}
 
 def _generate_jid() -> str:
     """Generate a unique job ID using UUID4."""
     return str(uuid.uuid4())
 
+def _now() -> str:
+    """Return the current UTC time as an ISO 8601 string, for job timestamps."""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
 def _instantiate_job(jid: str, status: str, hgnc_id_start: str, hgnc_id_end: str) -> dict:
     """
     Create the job object as a dictionary.
-    The job records the range of HGNC IDs to process.
+    The job records the range of HGNC IDs to process and when it was submitted.
     """
     return {
         "id": jid,
         "status": status,
         "hgnc_id_start": hgnc_id_start,
-        "hgnc_id_end": hgnc_id_end
+        "hgnc_id_end": hgnc_id_end,
+        "submitted_at": _now()
     }
 
-def _save_job(jid: str, job_dict: dict) -> None:
-    """Save the job object to the jobs database (db=2)."""
-    jdb.set(jid, json.dumps(job_dict))
+def _status_key(status: str) -> str:
+    """Return the jobs DB sorted set indexing listed jobs by status."""
+    return f"jobs:status:{status}"
+
+def _list_job(pipe: redis.client.Pipeline, job: dict) -> None:
+    """Queue the commands adding a job to the listing indexes on pipe, scored by the current time."""
+    now = time.time()
+    pipe.zadd(JOBS_INDEX_KEY, {job["id"]: now})
+    pipe.zadd(_status_key(job["status"]), {job["id"]: now})
+
+def _job_fields(job: dict) -> dict:
+    """Return the hash fields a job object is stored as, encoding _JSON_FIELDS as JSON."""
+    return {
+        field: json.dumps(value, sort_keys=True) if field in _JSON_FIELDS else value
+        for field, value in job.items() if value is not None
+    }
+
+def _prune_listing(pipe: redis.client.Pipeline) -> None:
+    """Queue the commands removing listing index entries for jobs older than JOB_TTL on pipe."""
+    if JOB_TTL > 0:
+        expired = time.time() - JOB_TTL
+        for index in (JOBS_INDEX_KEY,) + tuple(_status_key(status) for status in JOB_STATUSES):
+            pipe.zremrangebyscore(index, "-inf", expired)
+
+def _save_jobs(pipe: redis.client.Pipeline, jobs: list) -> None:
+    """
+    Queue the commands saving job objects to the jobs database (db=2) as hashes on pipe.
+    Every job expires JOB_TTL seconds after submission; the listing index entries of expired
+    jobs are pruned in the same pipeline, so the indexes stay bounded even if jobs are never listed.
+    """
+    for job in jobs:
+        pipe.hset(job["id"], mapping=_job_fields(job))
+        if JOB_TTL > 0:
+            pipe.expire(job["id"], JOB_TTL)
+    _prune_listing(pipe)
+
+def _shard_ranges(hgnc_id_start: str, hgnc_id_end: str, shard_size: int) -> list:
+    """
+    Split an HGNC ID range into consecutive (start, end) sub-ranges of at most shard_size numbers.
+    Returns a single range when sharding is disabled or the range is not wider than one shard.
+    """
+    start_num = int(hgnc_id_start.split(":")[1])
+    end_num = int(hgnc_id_end.split(":")[1])
+    if shard_size <= 0 or end_num - start_num + 1 <= shard_size:
+        return [(hgnc_id_start, hgnc_id_end)]
+    return [
+        (f"HGNC:{low}", f"HGNC:{min(low + shard_size - 1, end_num)}")
+        for low in range(start_num, end_num + 1, shard_size)
+    ]
+
+def normalize_analysis(analysis: dict = None) -> dict:
+    """
+    Validate a job's analysis and fill in its defaults; None means DEFAULT_ANALYSIS.
+    An analysis names a gene field and one of AGGREGATIONS, plus k for top_k.
+    Raises ValueError if it is malformed.
+    """
+    if analysis is None:
+        return dict(DEFAULT_ANALYSIS)
+    if not isinstance(analysis, dict):
+        raise ValueError("analysis must be an object with 'field' and 'aggregation'")
+    field = analysis.get("field")
+    aggregation = analysis.get("aggregation")
+    if not isinstance(field, str) or not field:
+        raise ValueError("analysis field must be the name of a gene attribute")
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"analysis aggregation must be one of: {', '.join(AGGREGATIONS)}")
+    normalized = {"field": field, "aggregation": aggregation}
+    if aggregation == "top_k":
+        k = analysis.get("k", DEFAULT_TOP_K)
+        if not isinstance(k, int) or isinstance(k, bool) or k <= 0:
+            raise ValueError("analysis k must be a positive integer")
+        normalized["k"] = k
+    return normalized
+
+def dataset_version(rd: redis.Redis) -> str:
+    """Return the current dataset version from the gene DB, "0" if the data was never loaded."""
+    version = rd.get(DATASET_VERSION_KEY)
+    return version.decode("utf-8") if version else "0"
+
+def job_cache_key(hgnc_id_start: str, hgnc_id_end: str, analysis: dict = None) -> str:
+    """
+    Return the jobs DB key naming the job for these parameters on the current dataset version.
+    IDs are reduced to their HGNC numbers, so "HGNC:05" and "HGNC:5" share a key.
+    """
+    version = dataset_version(rd)
+    start_num = int(hgnc_id_start.split(":")[1])
+    end_num = int(hgnc_id_end.split(":")[1])
+    key = f"jobcache:{version}:{start_num}:{end_num}"
+    analysis = normalize_analysis(analysis)
+    if analysis != DEFAULT_ANALYSIS:
+        key += ":" + hashlib.sha1(json.dumps(analysis, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return key
 
-def _queue_job(jid: str) -> None:
-    """Place the job ID onto the task queue."""
-    q.put(jid)
+def _reusable(job: dict) -> bool:
+    """
+    Return whether an existing job may answer an identical request: it is complete, or it is
+    still unfinished but has changed status or reported progress in the last JOB_STALL_TIMEOUT
+    seconds (a job whose worker died is never finished, and must not answer requests for a day).
+    """
+    if job["status"] in FINAL_STATUSES:
+        return job["status"] == "complete"
+    last_update = job.get("updated_at", job.get("submitted_at"))
+    if not last_update:
+        return False
+    return time.time() - datetime.fromisoformat(last_update).timestamp() < JOB_STALL_TIMEOUT
 
-def add_job(hgnc_id_start: str, hgnc_id_end: str, status: str = "submitted") -> dict:
+# Claim a job cache key for a new job and list the job, unless another job already holds the key.
+# KEYS: cache key, JOBS_INDEX_KEY, the job's status index; ARGV: job ID, cache TTL, listing score.
+# Returns the ID of the job holding the key, or nil if the new job claimed it and was listed.
+_claim_job = jdb.register_script("""
+local existing = redis.call('GET', KEYS[1])
+if existing then
+    return existing
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+return false
+""")
+
+def _execute_with_claim(queue) -> list:
+    """
+    Queue commands with queue(pipe) on a jobs DB pipeline and run them in one round trip.
+    _claim_job is called with a plain EVALSHA, since a pipeline holding Script objects checks
+    that they exist in a round trip of its own; if Redis has lost the script (e.g. it restarted)
+    it is loaded and the pipeline runs again, so the queued commands must be safe to repeat.
+    """
+    pipe = jdb.pipeline(transaction=False)
+    queue(pipe)
+    try:
+        return pipe.execute()
+    except redis.exceptions.NoScriptError:
+        _claim_job.sha = jdb.script_load(_claim_job.script)
+        pipe = jdb.pipeline(transaction=False)
+        queue(pipe)
+        return pipe.execute()
+
+def _cached_job(existing: bytes, cache_key: str, job: dict, ttl: int) -> dict:
+    """
+    Given the ID of the job that already held cache_key when job tried to claim it, return that
+    job if it may answer the request. Otherwise job takes over the key and is listed, and None is
+    returned so that it is queued.
+    """
+    found = get_job_by_id(existing.decode("utf-8"))
+    if found and _reusable(found):
+        return found
+    pipe = jdb.pipeline(transaction=False)
+    pipe.set(cache_key, job["id"], ex=ttl)
+    _list_job(pipe, job)
+    pipe.execute()
+    return None
+
+def forget_cached_job(job: dict) -> None:
+    """Stop answering new requests with this job, e.g. because it failed."""
+    if "cache_key" in job:
+        if jdb.get(job["cache_key"]) == job["id"].encode("utf-8"):
+            jdb.delete(job["cache_key"])
+
+def add_job(hgnc_id_start: str, hgnc_id_end: str, status: str = "submitted",
+            shard_size: int = JOB_SHARD_SIZE, cache_ttl: int = JOB_CACHE_TTL, analysis: dict = None) -> dict:
     """
     Add a new job specifying a range of HGNC Gene IDs.
-    Returns the created job dictionary.
+    The job runs analysis (see normalize_analysis), by default the approval date histogram.
+    If a job for the same range on the same dataset version was submitted in the last
+    cache_ttl seconds, that job is returned instead if it is complete or still making progress.
+    Ranges wider than shard_size are split into shard jobs that are queued independently
+    and merged into this job's results when the last one finishes.
+    Returns the created (or existing) job dictionary.
     """
+    analysis = normalize_analysis(analysis)
     jid = _generate_jid()
     job_dict = _instantiate_job(jid, status, hgnc_id_start, hgnc_id_end)
-    _save_job(jid, job_dict)
-    _queue_job(jid)
+    if analysis != DEFAULT_ANALYSIS:
+        job_dict["analysis"] = analysis
+    cache_key = job_cache_key(hgnc_id_start, hgnc_id_end, analysis) if cache_ttl > 0 else None
+    if cache_key:
+        job_dict["cache_key"] = cache_key
+    jobs = [job_dict]
+    ranges = _shard_ranges(hgnc_id_start, hgnc_id_end, shard_size)
+    if len(ranges) > 1:
+        # The shards add their progress to the job's, out of every gene in its range
+        total = rd.zcount(GENE_INDEX_KEY, int(hgnc_id_start.split(":")[1]), int(hgnc_id_end.split(":")[1]))
+        job_dict.update({"shards": len(ranges), "processed": 0, "total": total})
+        for i, (start, end) in enumerate(ranges):
+            shard = _instantiate_job(_generate_jid(), status, start, end)
+            shard.update({"parent": jid, "shard": i, "shards": len(ranges)})
+            if "analysis" in job_dict:
+                shard["analysis"] = analysis
+            jobs.append(shard)
+
+    def save(pipe: redis.client.Pipeline) -> None:
+        # The jobs are saved before the cache key is claimed, so whoever reads the key finds them
+        _save_jobs(pipe, jobs)
+        if cache_key:
+            pipe.evalsha(_claim_job.sha, 3, cache_key, JOBS_INDEX_KEY, _status_key(status), jid, cache_ttl, time.time())
+        else:
+            _list_job(pipe, job_dict)
+
+    results = _execute_with_claim(save)
+    existing = results[-1] if cache_key else None
+    if existing:
+        cached = _cached_job(existing, cache_key, job_dict, cache_ttl)
+        if cached:
+            jdb.delete(*[job["id"] for job in jobs])
+            return cached
+    # A sharded job is run by its shards alone
+    queued = jobs[1:] if len(jobs) > 1 else jobs
+    q.put(*[job["id"] for job in queued])
     return job_dict
 
+def add_completed_job(hgnc_id_start: str, hgnc_id_end: str, results: str) -> dict:
+    """
+    Add a job whose results were computed on submission, so it is never queued.
+    Returns the created job dictionary, already complete.
+    """
+    job_dict = _instantiate_job(_generate_jid(), "complete", hgnc_id_start, hgnc_id_end)
+    job_dict["started_at"] = job_dict["finished_at"] = job_dict["submitted_at"]
+    save_results(job_dict["id"], results)
+    pipe = jdb.pipeline(transaction=False)
+    _save_jobs(pipe, [job_dict])
+    _list_job(pipe, job_dict)
+    pipe.execute()
+    return job_dict
+
+def _is_wrong_type(error: redis.exceptions.ResponseError) -> bool:
+    """Whether a Redis error came from a hash command run on a job saved by an older version."""
+    return str(error).startswith("WRONGTYPE")
+
+def _upgrade_legacy_job(jid: str) -> None:
+    """
+    Convert a job saved by an older version as a JSON string into a hash in place, keeping
+    its expiry, so the hash commands used by status and progress updates work on it.
+    """
+    def upgrade(pipe: redis.client.Pipeline) -> None:
+        if pipe.type(jid) != b"string":
+            # Already converted by another client, or gone
+            pipe.unwatch()
+            return
+        job = json.loads(pipe.get(jid))
+        ttl = pipe.pttl(jid)
+        pipe.multi()
+        pipe.delete(jid)
+        pipe.hset(jid, mapping=_job_fields(job))
+        if ttl > 0:
+            pipe.pexpire(jid, ttl)
+
+    jdb.transaction(upgrade, jid)
+
 def get_job_by_id(jid: str) -> dict:
     """Retrieve job details by job ID."""
-    data = jdb.get(jid)
-    if data:
-        return json.loads(data)
-    return None
+    try:
+        data = jdb.hgetall(jid)
+    except redis.exceptions.ResponseError as e:
+        if not _is_wrong_type(e):
+            raise
+        # Jobs saved by older versions are JSON strings; convert them to hashes on first read
+        _upgrade_legacy_job(jid)
+        data = jdb.hgetall(jid)
+    if not data:
+        return None
+    job = {key.decode("utf-8"): value.decode("utf-8") for key, value in data.items()}
+    for field in _INT_FIELDS:
+        if field in job:
+            job[field] = int(job[field])
+    for field in _JSON_FIELDS:
+        if field in job:
+            job[field] = json.loads(job[field])
+    return job
 
-def update_job_status(jid: str, status: str) -> None:
-    """Update the job status for a given job ID."""
-    job = get_job_by_id(jid)
-    if job:
-        job["status"] = status
-        _save_job(jid, job)
-    else:
+def job_channel(jid: str) -> str:
+    """Return the Redis pub/sub channel on which a job's status and progress changes are published."""
+    return f"jobs:events:{jid}"
+
+# Move a job to a new status unless it has reached one of FINAL_STATUSES, in one round trip.
+# KEYS: job ID, then for listed jobs JOBS_INDEX_KEY, the new status index and the other status indexes.
+# ARGV: status, timestamp, timestamp field to set if unset (or ""), error (or ""), listing score
+# for a job missing from JOBS_INDEX_KEY, event channel, event, then FINAL_STATUSES.
+# Returns 1 if the status changed, 0 if the job was final, -1 if there is no such job and -2 if the
+# job was saved by an older version as a JSON string.
+_update_status = jdb.register_script("""
+local kind = redis.call('TYPE', KEYS[1])['ok']
+if kind == 'string' then
+    return -2
+end
+local current = redis.call('HGET', KEYS[1], 'status')
+if not current then
+    return -1
+end
+for i = 8, #ARGV do
+    if current == ARGV[i] then
+        return 0
+    end
+end
+redis.call('HSET', KEYS[1], 'status', ARGV[1], 'updated_at', ARGV[2])
+if ARGV[4] ~= '' then
+    redis.call('HSET', KEYS[1], 'error', ARGV[4])
+end
+if ARGV[3] ~= '' then
+    redis.call('HSETNX', KEYS[1], ARGV[3], ARGV[2])
+end
+if #KEYS > 1 then
+    local submitted = redis.call('ZSCORE', KEYS[2], KEYS[1]) or ARGV[5]
+    for i = 4, #KEYS do
+        redis.call('ZREM', KEYS[i], KEYS[1])
+    end
+    redis.call('ZADD', KEYS[3], submitted, KEYS[1])
+end
+redis.call('PUBLISH', ARGV[6], ARGV[7])
+return 1
+""")
+
+def update_job_status(jid: str, status: str, listed: bool = True, error: str = None) -> bool:
+    """
+    Update the job status for a given job ID atomically, in one round trip, unless the job has
+    already reached one of FINAL_STATUSES: a job redelivered after it finished never moves back.
+    Entering a status listed in STATUS_TIMESTAMPS also records when that first happened,
+    and an error (for "failed") is saved with it.
+    Listed jobs also move to the new status index; pass listed=False for shard jobs.
+    The change is published on the job's channel.
+    Returns False if the job was already final; raises if there is no such job.
+    """
+    keys = [jid]
+    if listed:
+        # Status indexes are scored by submission time like JOBS_INDEX_KEY, so entries are pruned
+        # when the job expires and a job keeps its place in the listing as its status changes
+        keys += [JOBS_INDEX_KEY, _status_key(status)]
+        keys += [_status_key(other) for other in JOB_STATUSES if other != status]
+    event = {"id": jid, "status": status}
+    if error:
+        event["error"] = error
+    args = [status, _now(), STATUS_TIMESTAMPS.get(status, ""), error or "", time.time(),
+            job_channel(jid), json.dumps(event), *FINAL_STATUSES]
+    result = _update_status(keys=keys, args=args)
+    if result == -2:
+        # A job saved by an older version as a JSON string: convert it and try again
+        _upgrade_legacy_job(jid)
+        result = _update_status(keys=keys, args=args)
+    if result == -1:
         raise Exception(f"No job found with id {jid}")
+    return result == 1
+
+def update_job_progress(jid: str, processed: int, total: int, partial_results: dict = None,
+                        parent: str = None, delta: int = 0) -> None:
+    """
+    Record how many of a running job's genes have been processed, optionally with the
+    results so far, and publish the progress on the job's channel, in one round trip.
+    For a shard, delta (the genes processed since its last update) is added to the parent's
+    processed count as well, and the parent's progress is published in a second round trip.
+    """
+    progress = {"processed": processed, "total": total, "updated_at": _now()}
+    if partial_results is not None:
+        progress["partial_results"] = json.dumps(partial_results, sort_keys=True)
+    pipe = jdb.pipeline(transaction=False)
+    pipe.hset(jid, mapping=progress)
+    pipe.publish(job_channel(jid), json.dumps({"id": jid, "processed": processed, "total": total}))
+    if parent:
+        pipe.hincrby(parent, "processed", delta)
+        pipe.hget(parent, "total")
+        pipe.hset(parent, "updated_at", progress["updated_at"])
+    results = pipe.execute()
+    if parent:
+        parent_processed, parent_total = results[2], int(results[3] or 0)
+        # A shard delivered twice counts its genes twice; never report more than the total
+        jdb.publish(job_channel(parent), json.dumps(
+            {"id": parent, "processed": min(parent_processed, parent_total), "total": parent_total}))
+
+def job_events(jid: str, timeout: float) -> Iterator[dict]:
+    """
+    Yield the job's current state, then each status or progress change published for it,
+    until it is complete or has failed. None is yielded whenever timeout seconds pass without a change.
+    """
+    pubsub = jdb.pubsub(ignore_subscribe_messages=True)
+    try:
+        # Subscribe before reading the job so no change in between is missed
+        pubsub.subscribe(job_channel(jid))
+        job = get_job_by_id(jid)
+        if not job:
+            return
+        yield job
+        if job["status"] in FINAL_STATUSES:
+            return
+        while True:
+            message = pubsub.get_message(timeout=timeout)
+            if message is None:
+                yield None
+                continue
+            event = json.loads(message["data"])
+            yield event
+            if event.get("status") in FINAL_STATUSES:
+                return
+    finally:
+        pubsub.close()
+
+def wait_for_job(jid: str, timeout: float) -> dict:
+    """
+    Return the job once it is complete or has failed, or as it stands after timeout seconds.
+    Waits on the job's channel rather than polling; returns None if there is no such job.
+    """
+    deadline = time.monotonic() + timeout
+    events = job_events(jid, min(timeout, 1.0))
+    try:
+        for event in events:
+            if event is not None and event.get("status") in FINAL_STATUSES:
+                break
+            if time.monotonic() >= deadline:
+                break
+    finally:
+        events.close()
+    return get_job_by_id(jid)
+
+def list_job_ids(status: str = None, cursor: str = None, limit: int = None) -> tuple:
+    """
+    Return one page of listed job IDs, oldest first by submission time, plus the cursor of the next page.
+    The cursor is the score of the last ID returned; the next cursor is None on the last page.
+    Index entries older than JOB_TTL are pruned first, in the same round trip.
+    """
+    key = JOBS_INDEX_KEY if status is None else _status_key(status)
+    start = "-inf" if cursor is None else f"({cursor}"
+    pipe = jdb.pipeline(transaction=False)
+    _prune_listing(pipe)
+    if limit is None:
+        pipe.zrangebyscore(key, start, "+inf", withscores=True)
+    else:
+        pipe.zrangebyscore(key, start, "+inf", start=0, num=limit, withscores=True)
+    members = pipe.execute()[-1]
+    job_ids = [member.decode("utf-8") for member, _ in members]
+    next_cursor = repr(members[-1][1]) if limit is not None and len(members) == limit else None
+    return job_ids, next_cursor
 
 def save_results(jid: str, results: str) -> None:
-    """Save analysis results to Redis (db=3)."""
-    rdb.set(jid, results)
+    """
+    Save analysis results to Redis (db=3) together with their ETag, in one round trip.
+    Both expire after JOB_TTL seconds.
+    """
+    ttl = JOB_TTL if JOB_TTL > 0 else None
+    pipe = rdb.pipeline()
+    pipe.set(jid, results, ex=ttl)
+    pipe.set(f"etag:{jid}", hashlib.sha1(results.encode("utf-8")).hexdigest(), ex=ttl)
+    pipe.execute()
+
+def get_results_etag(jid: str) -> str:
+    """Retrieve the ETag of a job's saved results, or None if there are none yet."""
+    etag = rdb.get(f"etag:{jid}")
+    if etag:
+        return etag.decode("utf-8")
+    return None
 
 def get_results(jid: str) -> str:
     """Retrieve analysis results for a job from Redis (db=3)."""
@@ -73,3 +537,24 @@ def get_results(jid: str) -> str:
     if data:
         return data.decode("utf-8")
     return None
+
+def save_partial_results(parent: str, shard: int, shards: int, partial: str) -> bool:
+    """
+    Save one shard's partial results for a parent job to Redis (db=3).
+    Returns True if this was the last of the parent's shards to report.
+    """
+    pipe = rdb.pipeline()
+    pipe.hset(f"partials:{parent}", shard, partial)
+    pipe.hlen(f"partials:{parent}")
+    if JOB_TTL > 0:
+        pipe.expire(f"partials:{parent}", JOB_TTL)
+    _, reported = pipe.execute()[:2]
+    return reported == shards
+
+def pop_partial_results(parent: str) -> list:
+    """Retrieve and delete all partial results saved for a parent job."""
+    pipe = rdb.pipeline()
+    pipe.hvals(f"partials:{parent}")
+    pipe.delete(f"partials:{parent}")
+    partials, _ = pipe.execute()
+    return [partial.decode("utf-8") for partial in partials]
@@ -0,0 +1,107 @@
+import os
+import time
+import redis
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Set PROMETHEUS_MULTIPROC_DIR to aggregate metrics across the worker's consumer processes
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+if MULTIPROCESS:
+    # Start from an empty directory; consumers are forked later and add their own files
+    _multiproc_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(_multiproc_dir, exist_ok=True)
+    for _name in os.listdir(_multiproc_dir):
+        if _name.endswith(".db"):
+            os.remove(os.path.join(_multiproc_dir, _name))
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to produce an API response, by route, method and status",
+    ["route", "method", "status"]
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds", "Redis round trip time by command; pipelines count as PIPELINE",
+    ["command"], buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+JOB_DURATION = Histogram(
+    "job_duration_seconds", "Time to process a job, by aggregation",
+    ["aggregation"], buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+GENE_CACHE_LOOKUPS = Counter(
+    "gene_cache_lookups", "Lookups in the API's GET /genes/<hgnc_id> response cache, by result (hit or miss)",
+    ["result"]
+)
+JOB_GENES = Counter("job_genes_processed", "Genes read by jobs")
+JOB_GENES_PER_SECOND = Gauge(
+    "job_genes_per_second", "Genes per second achieved by the most recently finished job",
+    multiprocess_mode="mostrecent"
+)
+
+def instrument_redis(client: redis.Redis) -> redis.Redis:
+    """
+    Time every command and pipeline the client sends, labelled by command name.
+    Wraps the client in place and returns it; costs one perf_counter pair per round trip.
+    """
+    execute_command = client.execute_command
+    make_pipeline = client.pipeline
+
+    def timed_execute_command(*args, **options):
+        start = time.perf_counter()
+        try:
+            return execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(time.perf_counter() - start)
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = make_pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def timed_execute(*exec_args, **exec_kwargs):
+            start = time.perf_counter()
+            try:
+                return execute(*exec_args, **exec_kwargs)
+            finally:
+                REDIS_COMMAND_DURATION.labels("PIPELINE").observe(time.perf_counter() - start)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    client.execute_command = timed_execute_command
+    client.pipeline = timed_pipeline
+    return client
+
+def observe_job(aggregation: str, seconds: float, genes: int) -> None:
+    """
+    Record a finished job's duration and throughput. genes is the number of genes the job read;
+    jobs that read none (answered from the range index) leave the throughput metrics alone.
+    """
+    JOB_DURATION.labels(aggregation).observe(seconds)
+    if genes and seconds > 0:
+        JOB_GENES.inc(genes)
+        JOB_GENES_PER_SECOND.set(genes / seconds)
+
+class QueueDepthCollector:
+    """Reports the number of queued jobs, read with one LLEN at scrape time rather than on any hot path."""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def collect(self):
+        depth = GaugeMetricFamily("job_queue_depth", "Jobs waiting in the queue")
+        try:
+            depth.add_metric([], len(self.queue))
+        except redis.exceptions.RedisError:
+            return
+        yield depth
+
+def metrics_registry(queue) -> CollectorRegistry:
+    """
+    Return the registry to expose: the default one, or in multiprocess mode one that merges
+    every process's metrics. The queue depth collector is added either way.
+    """
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    registry.register(QueueDepthCollector(queue))
+    return registry
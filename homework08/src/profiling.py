@@ -0,0 +1,84 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+import redis
+
+# Set PROFILING_ENABLED=true to let requests ask to be profiled; off by default
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Fraction of requests profiled without asking (0 profiles only requests that ask)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# Fewest seconds between two profiles started by one process
+PROFILE_MIN_INTERVAL = float(os.environ.get("PROFILE_MIN_INTERVAL", "10"))
+# Seconds a stored profile is kept
+PROFILE_TTL = int(os.environ.get("PROFILE_TTL", "3600"))
+# Number of functions listed in a profile's text report
+PROFILE_TOP = int(os.environ.get("PROFILE_TOP", "40"))
+
+# Only one profile runs at a time per process; cProfile cannot profile two requests at once anyway
+_profile_lock = threading.Lock()
+_last_profile = 0.0
+
+def profile_key(request_id: str) -> str:
+    """Return the Redis hash holding a request's profile."""
+    return f"profile:{request_id}"
+
+def start_profile(requested: bool):
+    """
+    Start profiling the calling thread if profiling is enabled and the request asked for it
+    (or was sampled), no other profile is running and PROFILE_MIN_INTERVAL seconds have passed
+    since the last one. Returns the running profiler, or None.
+    """
+    global _last_profile
+    if not PROFILING_ENABLED:
+        return None
+    if not requested and random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    now = time.monotonic()
+    if _last_profile and now - _last_profile < PROFILE_MIN_INTERVAL:
+        _profile_lock.release()
+        return None
+    _last_profile = now
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler (e.g. a debugger) already owns this interpreter
+        _profile_lock.release()
+        return None
+    return profiler
+
+def new_request_id() -> str:
+    """Return a fresh ID to store a profile under."""
+    return str(uuid.uuid4())
+
+def finish_profile(profiler: cProfile.Profile, rd: redis.Redis, request_id: str, description: str,
+                   elapsed: float) -> None:
+    """
+    Stop the profiler and store its report under profile_key(request_id) for PROFILE_TTL seconds:
+    a text summary of the PROFILE_TOP functions by cumulative time, and the raw pstats data.
+    """
+    try:
+        profiler.disable()
+        report = io.StringIO()
+        report.write(f"{description} in {elapsed * 1000:.1f} ms\n")
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        pipe = rd.pipeline()
+        pipe.hset(profile_key(request_id), mapping={"report": report.getvalue(),
+                                                    "pstats": marshal.dumps(stats.stats)})
+        pipe.expire(profile_key(request_id), PROFILE_TTL)
+        pipe.execute()
+    finally:
+        _profile_lock.release()
+
+def get_profile(rd: redis.Redis, request_id: str, field: str = "report") -> bytes:
+    """Return a stored profile's text report or raw pstats data, or None if there is none."""
+    return rd.hget(profile_key(request_id), field)
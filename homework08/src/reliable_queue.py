@@ -0,0 +1,119 @@
+import os
+import pickle
+import socket
+import uuid
+import redis
+from hotqueue import key_for_name
+
+class ReliableQueue:
+    """
+    FIFO queue stored in the same Redis list as HotQueue, so either kind can put onto it,
+    but messages are never popped destructively.
+
+    get() atomically moves a message onto the calling consumer's processing list, where it
+    stays until ack(). Every consumer keeps a heartbeat key alive while it runs; once a
+    consumer's heartbeat has been missing for visibility_timeout seconds, requeue_expired()
+    puts its in-flight messages back at the head of the queue.
+    """
+
+    def __init__(self, name: str, visibility_timeout: int = 60, **kwargs):
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self._redis = redis.Redis(**kwargs)
+        self._in_flight = {}
+        self._consumer = None
+        self._consumer_pid = None
+
+    @property
+    def key(self) -> str:
+        """Return the Redis list holding queued messages."""
+        return key_for_name(self.name)
+
+    @property
+    def consumer(self) -> str:
+        """
+        Return this consumer's ID; each process is its own consumer. A random token is added
+        because a restarted container reuses its hostname and PIDs, and must not adopt (and keep
+        alive) the processing list of the consumer that died before it.
+        """
+        if self._consumer_pid != os.getpid():
+            self._consumer = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+            self._consumer_pid = os.getpid()
+        return self._consumer
+
+    def _processing_key(self, consumer: str) -> str:
+        """Return the Redis list holding a consumer's in-flight messages."""
+        return f"{self.key}:processing:{consumer}"
+
+    def _heartbeat_key(self, consumer: str) -> str:
+        """Return the expiring key whose presence means a consumer is alive."""
+        return f"{self.key}:heartbeat:{consumer}"
+
+    @property
+    def _consumers_key(self) -> str:
+        """Return the Redis set of consumers that may hold in-flight messages."""
+        return f"{self.key}:consumers"
+
+    def __len__(self) -> int:
+        return self._redis.llen(self.key)
+
+    def put(self, *msgs) -> None:
+        """Put one or more messages onto the queue."""
+        self._redis.rpush(self.key, *[pickle.dumps(msg) for msg in msgs])
+
+    def get(self, block: bool = False, timeout: int = None):
+        """
+        Move the next message onto this consumer's processing list and return it.
+        Returns None if the queue is empty (after waiting up to timeout seconds when blocking).
+        """
+        processing = self._processing_key(self.consumer)
+        if block:
+            raw = self._redis.blmove(self.key, processing, timeout or 0, "LEFT", "RIGHT")
+        else:
+            raw = self._redis.lmove(self.key, processing, "LEFT", "RIGHT")
+        if raw is None:
+            return None
+        msg = pickle.loads(raw)
+        self._in_flight[msg] = raw
+        return msg
+
+    def ack(self, msg) -> None:
+        """Remove a finished message from this consumer's processing list."""
+        raw = self._in_flight.pop(msg, None) or pickle.dumps(msg)
+        self._redis.lrem(self._processing_key(self.consumer), 1, raw)
+
+    def heartbeat(self) -> None:
+        """
+        Mark this consumer alive for another visibility_timeout seconds and register it.
+        Both happen in one transaction, heartbeat first, so requeue_expired never sees
+        a registered consumer without its heartbeat.
+        """
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.set(self._heartbeat_key(self.consumer), 1, ex=self.visibility_timeout)
+        pipe.sadd(self._consumers_key, self.consumer)
+        pipe.execute()
+
+    def retire(self) -> None:
+        """Deregister this consumer after a clean shutdown, requeueing anything it left unacknowledged."""
+        self._requeue(self.consumer)
+        self._redis.delete(self._heartbeat_key(self.consumer))
+
+    def _requeue(self, consumer: str) -> int:
+        """Move every message on a consumer's processing list back to the head of the queue."""
+        count = 0
+        while self._redis.lmove(self._processing_key(consumer), self.key, "RIGHT", "LEFT") is not None:
+            count += 1
+        self._redis.srem(self._consumers_key, consumer)
+        return count
+
+    def requeue_expired(self) -> int:
+        """
+        Requeue the in-flight messages of every consumer whose heartbeat has expired.
+        Safe to run from several consumers at once; returns the number of messages requeued.
+        """
+        count = 0
+        for consumer in self._redis.smembers(self._consumers_key):
+            consumer = consumer.decode("utf-8")
+            if not self._redis.exists(self._heartbeat_key(consumer)):
+                count += self._requeue(consumer)
+        return count
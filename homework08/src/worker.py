@@ -2,120 +2,589 @@ import os
 import json
 import time
 import logging
-from datetime import datetime
-from jobs import q, update_job_status, get_job_by_id, save_results, rd
+import multiprocessing
+import multiprocessing.connection
+import signal
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Callable, Iterable, Iterator, NamedTuple
+import redis
+from codec import decode_genes
+from dates import parse_date, partial_summary, merge_summaries, finalize_summary, summarize_dates
+from date_index import get_date_index
+from prometheus_client import start_http_server
+from metrics import metrics_registry, observe_job
+from jobs import (q, update_job_status, update_job_progress, get_job_by_id, save_results, save_partial_results,
+                  pop_partial_results, forget_cached_job, rd, DEFAULT_ANALYSIS, GENE_INDEX_KEY, GENE_DATES_KEY, QUEUE_MODE, QUEUE_VISIBILITY_TIMEOUT)
 
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
 
-def parse_date(date_str: str) -> datetime:
-    """
-    Parse a date string using either "m/d/yyyy" or "YYYY-MM-DD" format.
-    """
-    date_str = date_str.strip()
-    for fmt in ("%m/%d/%Y", "%Y-%m-%d"):
-        try:
-            return datetime.strptime(date_str, fmt)
-        except ValueError:
-            continue
-    raise ValueError(f"cannot parse date '{date_str}'")
+# Number of gene records fetched per MGET round trip
+JOB_BATCH_SIZE = int(os.environ.get("JOB_BATCH_SIZE", "500"))
+# Minimum seconds between progress updates published by a running job
+JOB_PROGRESS_INTERVAL = float(os.environ.get("JOB_PROGRESS_INTERVAL", "1"))
+# Whether progress updates also carry the results computed so far
+JOB_PARTIAL_RESULTS = os.environ.get("JOB_PARTIAL_RESULTS", "false").lower() in ("1", "true", "yes")
+# Most jobs a consumer takes off the queue at once to serve with one shared scan
+JOB_DRAIN_SIZE = int(os.environ.get("JOB_DRAIN_SIZE", "1"))
+# Port serving the worker's Prometheus metrics (0 disables)
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", "9100"))
+# Number of consumer processes pulling jobs from the queue
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "1"))
+# Seconds each consumer blocks on the queue before checking for a stop request
+QUEUE_POLL_TIMEOUT = int(os.environ.get("QUEUE_POLL_TIMEOUT", "1"))
+# Most seconds a consumer waits before retrying Redis after a connection error (the wait doubles from 1)
+QUEUE_MAX_BACKOFF = float(os.environ.get("QUEUE_MAX_BACKOFF", "30"))
 
 def get_hgnc_ids_in_range(hgnc_id_start: str, hgnc_id_end: str) -> list:
     """
     Retrieve HGNC IDs from Redis within the numeric range [start, end].
-    Assumes gene keys are stored as "gene:HGNC:<number>".
+    Uses the sorted-set index maintained by the loader, so the lookup is O(log N + M).
 
     :param hgnc_id_start: Start HGNC ID (e.g., "HGNC:6")
     :param hgnc_id_end: End HGNC ID (e.g., "HGNC:12345")
-    :return: List of HGNC IDs within the range.
+    :return: List of HGNC IDs within the range, in numeric order.
     """
-    all_keys = rd.keys("gene:HGNC:*")
-    gene_list = []
-    for key in all_keys:
-        try:
-            gene_id = key.decode("utf-8").replace("gene:", "")
-            num = int(gene_id.split(":")[1])
-            gene_list.append((gene_id, num))
-        except Exception:
-            continue
     try:
         start_num = int(hgnc_id_start.split(":")[1])
         end_num = int(hgnc_id_end.split(":")[1])
     except Exception:
         return []
-    filtered = [gid for (gid, num) in gene_list if start_num <= num <= end_num]
-    return filtered
+    return [member.decode("utf-8") for member in rd.zrangebyscore(GENE_INDEX_KEY, start_num, end_num)]
+
+def fetch_genes(gene_ids: list, batch_size: int = JOB_BATCH_SIZE) -> Iterator[tuple]:
+    """
+    Yield (hgnc_id, gene_dict) pairs for the given IDs, skipping genes missing from Redis.
+    Genes are fetched batch_size at a time with MGET and each batch is decoded in bulk.
+    """
+    for i in range(0, len(gene_ids), batch_size):
+        batch = gene_ids[i:i + batch_size]
+        values = rd.mget(["gene:" + gid for gid in batch])
+        found = [(gid, value) for gid, value in zip(batch, values) if value]
+        if not found:
+            continue
+        genes = decode_genes([value for _, value in found])
+        yield from zip((gid for gid, _ in found), genes)
+
+def approval_ordinals(gene_ids: list, batch_size: int = JOB_BATCH_SIZE) -> Iterator[int]:
+    """
+    Yield the approval date ordinals precomputed by the loader for the given IDs.
+    Reads the date column batch_size IDs per HMGET; genes without a valid date are skipped.
+    """
+    for i in range(0, len(gene_ids), batch_size):
+        for value in rd.hmget(GENE_DATES_KEY, gene_ids[i:i + batch_size]):
+            if value is not None:
+                yield int(value)
+
+def _ordinals_from_documents(gene_ids: list) -> Iterator[int]:
+    """
+    Yield approval date ordinals by decoding the full gene records.
+    Only used for data loaded before the approval date column existed.
+    """
+    for gid, gene_data in fetch_genes(gene_ids):
+        date_str = gene_data.get("date_approved_reserved", "").strip()
+        if not date_str:
+            continue
+        try:
+            yield parse_date(date_str).toordinal()
+        except ValueError:
+            logging.warning(f"Skipping {gid}: cannot parse date '{date_str}'")
+
+def count_values(jid: str, gene_ids: list, read_values, summarize=None, batch_size: int = JOB_BATCH_SIZE,
+                 parent: str = None) -> Counter:
+    """
+    Count the values read_values returns for gene_ids, batch_size IDs at a time.
+    After a batch the job's progress is published, at most every JOB_PROGRESS_INTERVAL seconds
+    and always after the last batch; with JOB_PARTIAL_RESULTS, summarize(counts) goes with it.
+    A shard also adds its progress to its parent job's.
+    """
+    counts = Counter()
+    reported = 0
+    last_update = time.monotonic()
+    for i in range(0, len(gene_ids), batch_size):
+        batch = gene_ids[i:i + batch_size]
+        counts.update(read_values(batch))
+        processed = i + len(batch)
+        now = time.monotonic()
+        if processed == len(gene_ids) or now - last_update >= JOB_PROGRESS_INTERVAL:
+            partial_results = summarize(counts) if summarize and JOB_PARTIAL_RESULTS and counts else None
+            update_job_progress(jid, processed, len(gene_ids), partial_results,
+                                parent=parent, delta=processed - reported)
+            reported = processed
+            last_update = now
+    return counts
+
+def field_values(gene: dict, field: str) -> Iterator:
+    """
+    Yield a gene's values for field. Every element of a list-valued field is a value of its own;
+    missing and empty values are skipped, and values that are not strings are JSON-encoded.
+    """
+    value = gene.get(field)
+    for item in value if isinstance(value, list) else [value]:
+        if item is None or item == "":
+            continue
+        yield item if isinstance(item, str) else json.dumps(item, sort_keys=True)
+
+def _date_ordinals(gene: dict, field: str) -> Iterator[int]:
+    """Yield the date ordinals of a gene's values for field, skipping values that are not dates."""
+    for value in field_values(gene, field):
+        try:
+            yield parse_date(value).toordinal()
+        except ValueError:
+            continue
+
+def _count_by_result(counts: Counter, analysis: dict) -> dict:
+    """Result of a count_by analysis: how many genes have each value, most common first."""
+    return {"field": analysis["field"], "total": sum(counts.values()), "counts": dict(counts.most_common())}
+
+def _top_k_result(counts: Counter, analysis: dict) -> dict:
+    """Result of a top_k analysis: the k most common values and their counts."""
+    return {
+        "field": analysis["field"],
+        "total": sum(counts.values()),
+        "distinct": len(counts),
+        "top": [{"value": value, "count": n} for value, n in counts.most_common(analysis["k"])]
+    }
+
+def _date_histogram_result(counts: Counter, analysis: dict) -> dict:
+    """Result of a date_histogram analysis, in the same format as the approval date summary."""
+    return summarize_dates(counts)
+
+class Aggregator(NamedTuple):
+    """How an aggregation counts one gene, and how it turns the counts into the job's results."""
+    values: Callable[[dict, str], Iterable]
+    result: Callable[[Counter, dict], dict]
+
+# Aggregations jobs can request, by name (see jobs.AGGREGATIONS)
+AGGREGATORS = {
+    "count_by": Aggregator(field_values, _count_by_result),
+    "top_k": Aggregator(field_values, _top_k_result),
+    "date_histogram": Aggregator(_date_ordinals, _date_histogram_result),
+}
+
+def run_analysis(jid: str, gene_ids: list, analysis: dict, parent: str = None) -> dict:
+    """
+    Run a job's analysis over the given genes in one batched pass over their records.
+    Returns a mergeable partial summary holding the counts as [value, count] pairs.
+    """
+    aggregator = AGGREGATORS[analysis["aggregation"]]
+    field = analysis["field"]
+
+    def read_values(batch: list) -> Iterator:
+        for _, gene in fetch_genes(batch):
+            yield from aggregator.values(gene, field)
+
+    counts = count_values(jid, gene_ids, read_values, lambda counts: aggregator.result(counts, analysis), parent=parent)
+    return {"counts": list(counts.items())}
+
+def finish_results(analysis: dict, partials: list) -> dict:
+    """Merge the partial summaries of a job (one per shard, or just one) into its results."""
+    if analysis == DEFAULT_ANALYSIS:
+        return finalize_summary(merge_summaries(partials))
+    counts = Counter()
+    for partial in partials:
+        for value, n in partial["counts"]:
+            counts[value] += n
+    return AGGREGATORS[analysis["aggregation"]].result(counts, analysis)
+
+def _finish_shard(job: dict, summary: dict) -> None:
+    """
+    Save a shard's partial summary under its parent job. The shard that reports last
+    merges every partial into the parent's results and marks the parent complete.
+    """
+    parent = job["parent"]
+    if not save_partial_results(parent, job["shard"], job["shards"], json.dumps(summary)):
+        return
+    partials = [json.loads(partial) for partial in pop_partial_results(parent)]
+    results = finish_results(job.get("analysis", DEFAULT_ANALYSIS), partials)
+    save_results(parent, json.dumps(results, indent=2, sort_keys=True))
+    update_job_status(parent, "complete")
+    logging.info(f"Job {parent} complete. Merged {len(partials)} shards.")
+
+def _fail_job(job: dict, error: Exception) -> None:
+    """
+    Mark a job that raised as failed, and the parent of a failed shard with it, so clients
+    waiting on either see it end. Identical requests are no longer answered by the job.
+    """
+    try:
+        message = str(error)
+        update_job_status(job["id"], "failed", listed="parent" not in job, error=message)
+        if "parent" in job:
+            update_job_status(job["parent"], "failed",
+                              error=f"Shard {job['shard'] + 1}/{job['shards']} failed: {message}")
+            job = get_job_by_id(job["parent"]) or {}
+        forget_cached_job(job)
+    except Exception as e:
+        logging.error(f"Error marking job {job.get('id')} as failed: {str(e)}")
+
+def _complete_job(job: dict, analysis: dict, summary: dict) -> None:
+    """
+    Store a processed job's results and mark it complete. A shard stores its partial summary
+    instead, and the last shard to finish merges them into the parent job's results.
+    """
+    jid = job["id"]
+    if "parent" in job:
+        _finish_shard(job, summary)
+        update_job_status(jid, "complete", listed=False)
+        logging.info(f"Shard {job['shard'] + 1}/{job['shards']} of job {job['parent']} complete.")
+        return
+    results = finish_results(analysis, [summary])
+    save_results(jid, json.dumps(results, indent=2, sort_keys=True))
+    update_job_status(jid, "complete")
+    logging.info(f"Job {jid} complete.")
+
+def _start_job(job: dict) -> bool:
+    """
+    Mark a job (and the parent of a shard) as in progress. Returns False, leaving both alone,
+    if the job or the shard's parent has already finished: the queue delivers at least once,
+    and a shard that ran again after its parent was merged could never be merged itself.
+    """
+    if "parent" in job and not update_job_status(job["parent"], "in progress"):
+        logging.info(f"Skipping shard {job['id']}: job {job['parent']} has already finished.")
+        return False
+    if not update_job_status(job["id"], "in progress", listed="parent" not in job):
+        logging.info(f"Skipping job {job['id']}: it has already finished.")
+        return False
+    logging.info(f"Processing job {job['id']}")
+    return True
 
-@q.worker
 def process_job(jid: str) -> None:
     """
     Process a job by:
-    - Retrieving gene records in the specified HGNC ID range.
-    - Extracting and parsing the 'date_approved_reserved' field.
-    - Computing a yearly breakdown, as well as the earliest and latest approval dates.
+    - Retrieving the HGNC IDs in the specified range from the index.
+    - Reading their precomputed approval dates (or parsing 'date_approved_reserved' for older data).
+    - Computing a yearly breakdown, as well as the earliest and latest approval dates,
+      while publishing the job's progress between batches.
     - Storing the resulting JSON summary in Redis (db=3) and updating the job status.
+    A job that asks for another analysis runs it instead over the gene records in the range.
+    When the approval date range index is built for the current data, the approval date
+    summary is read from it instead, in time independent of the range width.
     """
+    job = None
+    started = time.perf_counter()
     try:
-        update_job_status(jid, "in progress")
-        logging.info(f"Processing job {jid}")
-
         job = get_job_by_id(jid)
         if not job:
             logging.error(f"Job {jid} not found.")
             return
 
+        if not _start_job(job):
+            return
+
         hgnc_start = job["hgnc_id_start"]
         hgnc_end = job["hgnc_id_end"]
 
-        # Retrieve gene IDs within the specified range.
-        gene_ids = get_hgnc_ids_in_range(hgnc_start, hgnc_end)
-        logging.info(f"Found {len(gene_ids)} gene IDs in range {hgnc_start} to {hgnc_end}")
+        analysis = job.get("analysis", DEFAULT_ANALYSIS)
+        index = get_date_index(rd) if analysis == DEFAULT_ANALYSIS else None
+        if index:
+            # Answered from the range index, whatever the width of the range
+            summary = index.summarize(int(hgnc_start.split(":")[1]), int(hgnc_end.split(":")[1]))
+            # No gene is read, so the job adds nothing to the throughput metrics
+            genes = 0
+            if "parent" in job:
+                # Count the shard's genes towards its parent's progress, as a scan would have
+                n = rd.zcount(GENE_INDEX_KEY, int(hgnc_start.split(":")[1]), int(hgnc_end.split(":")[1]))
+                update_job_progress(jid, n, n, parent=job["parent"], delta=n)
+        else:
+            # Retrieve gene IDs within the specified range.
+            gene_ids = get_hgnc_ids_in_range(hgnc_start, hgnc_end)
+            genes = len(gene_ids)
+            logging.info(f"Found {len(gene_ids)} gene IDs in range {hgnc_start} to {hgnc_end}")
+            if analysis != DEFAULT_ANALYSIS:
+                summary = run_analysis(jid, gene_ids, analysis, job.get("parent"))
+            else:
+                read_ordinals = approval_ordinals if rd.exists(GENE_DATES_KEY) else _ordinals_from_documents
+                summary = partial_summary(count_values(jid, gene_ids, read_ordinals, summarize_dates,
+                                                       parent=job.get("parent")))
+
+        _complete_job(job, analysis, summary)
+        observe_job(analysis["aggregation"], time.perf_counter() - started, genes)
+
+    except Exception as e:
+        logging.error(f"Error processing job {jid}: {str(e)}")
+        if job:
+            _fail_job(job, e)
 
-        total_genes = 0
-        earliest_date = None
-        latest_date = None
-        yearly_breakdown = {}
+class _ScanJob(NamedTuple):
+    """A job taking part in a shared scan: its range, how it counts each item, and its counts so far."""
+    job: dict
+    analysis: dict
+    start_num: int
+    end_num: int
+    values: Callable
+    counts: Counter
 
-        for gid in gene_ids:
-            key = "gene:" + gid
-            gene_str = rd.get(key)
-            if not gene_str:
+def _read_dates(batch: list) -> Iterator[tuple]:
+    """Yield (hgnc_id, approval ordinal) for the genes in batch that have one, with one HMGET."""
+    for gid, value in zip(batch, rd.hmget(GENE_DATES_KEY, batch)):
+        if value is not None:
+            yield gid, int(value)
+
+def _scan_plan(job: dict, has_dates: bool) -> tuple:
+    """
+    Return how a shared scan serves this job: the reader to scan with ("dates" for the approval
+    date column, "documents" for whole gene records) and a function giving the values to count
+    for each item the reader yields.
+    """
+    analysis = job.get("analysis", DEFAULT_ANALYSIS)
+    if analysis == DEFAULT_ANALYSIS:
+        if has_dates:
+            return "dates", lambda ordinal: (ordinal,)
+        return "documents", lambda gene: _date_ordinals(gene, "date_approved_reserved")
+    aggregator = AGGREGATORS[analysis["aggregation"]]
+    return "documents", lambda gene: aggregator.values(gene, analysis["field"])
+
+# Readers a shared scan can use: each yields (hgnc_id, item) for the IDs of one batch
+_SCAN_READERS = {"dates": _read_dates, "documents": fetch_genes}
+
+def _merge_ranges(scan_jobs: list) -> list:
+    """Return the union of the jobs' HGNC number ranges as sorted, non-overlapping (start, end) pairs."""
+    merged = []
+    for start_num, end_num in sorted((sj.start_num, sj.end_num) for sj in scan_jobs):
+        if merged and start_num <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end_num)
+        else:
+            merged.append([start_num, end_num])
+    return [tuple(r) for r in merged]
+
+def _scan_progress(sj: _ScanJob) -> dict:
+    """Results so far of a job in a shared scan, published with its progress under JOB_PARTIAL_RESULTS."""
+    if sj.analysis == DEFAULT_ANALYSIS:
+        return summarize_dates(sj.counts)
+    return AGGREGATORS[sj.analysis["aggregation"]].result(sj.counts, sj.analysis)
+
+def shared_scan(scan_jobs: list, read_batch, batch_size: int = JOB_BATCH_SIZE) -> int:
+    """
+    Scan the union of the jobs' ranges once, batch_size genes per round trip,
+    and feed every gene to each job whose range contains it. Returns the number of genes scanned.
+    Each job's progress through its own range is published as in count_values.
+    """
+    gene_ids = []
+    for start_num, end_num in _merge_ranges(scan_jobs):
+        gene_ids.extend(get_hgnc_ids_in_range(f"HGNC:{start_num}", f"HGNC:{end_num}"))
+    numbers = [int(gid.split(":")[1]) for gid in gene_ids]
+    # Each job's genes are the slice [lo, hi) of the scan, which is in HGNC number order
+    bounds = [(bisect_left(numbers, sj.start_num), bisect_right(numbers, sj.end_num)) for sj in scan_jobs]
+    reported = [0] * len(scan_jobs)
+    last_update = time.monotonic()
+    for i in range(0, len(gene_ids), batch_size):
+        batch = gene_ids[i:i + batch_size]
+        for gid, item in read_batch(batch):
+            number = int(gid.split(":")[1])
+            for sj in scan_jobs:
+                if sj.start_num <= number <= sj.end_num:
+                    sj.counts.update(sj.values(item))
+        scanned = i + len(batch)
+        now = time.monotonic()
+        due = now - last_update >= JOB_PROGRESS_INTERVAL
+        for n, (sj, (lo, hi)) in enumerate(zip(scan_jobs, bounds)):
+            # Report jobs this batch read genes for: when an update is due, and always after their last gene
+            if lo < scanned and i < hi and (due or hi <= scanned):
+                processed = min(scanned, hi) - lo
+                partial_results = _scan_progress(sj) if JOB_PARTIAL_RESULTS and sj.counts else None
+                update_job_progress(sj.job["id"], processed, hi - lo, partial_results,
+                                    parent=sj.job.get("parent"), delta=processed - reported[n])
+                reported[n] = processed
+        if due:
+            last_update = now
+    return len(gene_ids)
+
+def process_jobs(jids: list) -> None:
+    """
+    Process several jobs with one scan of the genes they cover between them.
+    Jobs answered by the range index, and any job whose shared scan fails, are processed one by one.
+    """
+    if len(jids) == 1:
+        process_job(jids[0])
+        return
+    scans = {reader: [] for reader in _SCAN_READERS}
+    processed = set()
+    try:
+        has_dates = rd.exists(GENE_DATES_KEY)
+        index = get_date_index(rd)
+        for jid in jids:
+            job = get_job_by_id(jid)
+            if not job or (index and "analysis" not in job):
+                process_job(jid)
+                processed.add(jid)
                 continue
-            gene_data = json.loads(gene_str)
-            date_str = gene_data.get("date_approved_reserved", "").strip()
-            if not date_str:
+            if not _start_job(job):
+                processed.add(jid)
                 continue
+            reader, values = _scan_plan(job, has_dates)
+            scans[reader].append(_ScanJob(
+                job, job.get("analysis", DEFAULT_ANALYSIS), int(job["hgnc_id_start"].split(":")[1]),
+                int(job["hgnc_id_end"].split(":")[1]), values, Counter()
+            ))
+    except Exception as e:
+        logging.error(f"Error preparing jobs {jids} for a shared scan: {str(e)}")
+        scans = {reader: [] for reader in _SCAN_READERS}
+        for jid in jids:
+            if jid not in processed:
+                process_job(jid)
+
+    for reader, scan_jobs in scans.items():
+        if not scan_jobs:
+            continue
+        started = time.perf_counter()
+        try:
+            scanned = shared_scan(scan_jobs, _SCAN_READERS[reader])
+            logging.info(f"Shared one {reader} scan between {len(scan_jobs)} jobs.")
+            # A shared scan is recorded once, under the first job's aggregation
+            observe_job(scan_jobs[0].analysis["aggregation"], time.perf_counter() - started, scanned)
+        except Exception as e:
+            logging.error(f"Shared {reader} scan failed, processing its jobs one by one: {str(e)}")
+            for sj in scan_jobs:
+                process_job(sj.job["id"])
+            continue
+        for sj in scan_jobs:
             try:
-                dt = parse_date(date_str)
+                if sj.analysis == DEFAULT_ANALYSIS:
+                    summary = partial_summary(sj.counts)
+                else:
+                    summary = {"counts": list(sj.counts.items())}
+                _complete_job(sj.job, sj.analysis, summary)
             except Exception as e:
-                logging.warning(f"Skipping {gid}: cannot parse date '{date_str}'")
+                logging.error(f"Error processing job {sj.job['id']}: {str(e)}")
+                _fail_job(sj.job, e)
+
+def _keep_alive(done: threading.Event) -> None:
+    """
+    Refresh this consumer's reliable-queue heartbeat and requeue jobs held by dead consumers
+    until done is set. Runs every third of the visibility timeout.
+    """
+    interval = max(QUEUE_VISIBILITY_TIMEOUT / 3, 1)
+    while not done.is_set():
+        try:
+            q.heartbeat()
+            requeued = q.requeue_expired()
+            if requeued:
+                logging.warning("Requeued %d job(s) from consumers whose heartbeat expired.", requeued)
+        except Exception as e:
+            logging.error("Queue heartbeat failed: %s", e)
+        done.wait(interval)
+
+def _drain_limit() -> int:
+    """
+    Return how many jobs a consumer takes at once, counting the one it already has: up to
+    JOB_DRAIN_SIZE, but no more than its share of the waiting jobs among WORKER_CONCURRENCY
+    consumers, so a burst is spread over every consumer instead of drained by the first.
+    """
+    if JOB_DRAIN_SIZE <= 1:
+        return 1
+    share = (len(q) + WORKER_CONCURRENCY) // WORKER_CONCURRENCY
+    return max(1, min(JOB_DRAIN_SIZE, share))
+
+def consume(stop) -> None:
+    """
+    Process jobs from the queue until stop is set.
+    The queue is polled with a short timeout so a stop request is noticed between jobs;
+    a job that is already running is always finished first. Up to _drain_limit() jobs that
+    are already waiting are taken at once and share one scan. In reliable queue mode each
+    job is acknowledged once processed, and a heartbeat thread keeps this consumer's
+    in-flight job from being requeued while it runs. When Redis cannot be reached the
+    consumer backs off, up to QUEUE_MAX_BACKOFF seconds, and tries again.
+    """
+    reliable = QUEUE_MODE == "reliable"
+    if reliable:
+        done = threading.Event()
+        q.heartbeat()
+        threading.Thread(target=_keep_alive, args=(done,), daemon=True).start()
+    backoff = 1
+    try:
+        while not stop.is_set():
+            try:
+                jid = q.get(block=True, timeout=QUEUE_POLL_TIMEOUT)
+                if jid is None:
+                    continue
+                jids = [jid]
+                limit = _drain_limit()
+                while len(jids) < limit:
+                    jid = q.get()
+                    if jid is None:
+                        break
+                    jids.append(jid)
+                process_jobs(jids)
+                if reliable:
+                    for jid in jids:
+                        q.ack(jid)
+                backoff = 1
+            except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+                logging.error(f"Lost the connection to Redis, retrying in {backoff:.0f}s: {str(e)}")
+                stop.wait(backoff)
+                backoff = min(backoff * 2, QUEUE_MAX_BACKOFF)
+    finally:
+        if reliable:
+            done.set()
+            q.retire()
+
+def supervise(start_consumer, count: int, stop, started=None) -> None:
+    """
+    Start count consumers with start_consumer(i), which returns the started process, call
+    started() if given, and wait for them to exit. A consumer that exits before stop is set
+    (e.g. it crashed) is replaced after a second, so the worker keeps its full concurrency.
+    """
+    consumers = {}
+    for i in range(count):
+        consumer = start_consumer(i)
+        consumers[consumer.sentinel] = (i, consumer)
+    if started:
+        started()
+    while consumers:
+        for sentinel in multiprocessing.connection.wait(list(consumers)):
+            i, consumer = consumers.pop(sentinel)
+            consumer.join()
+            if stop.is_set():
                 continue
-            
-            total_genes += 1
-            if earliest_date is None or dt < earliest_date:
-                earliest_date = dt
-            if latest_date is None or dt > latest_date:
-                latest_date = dt
-
-            year = dt.year
-            yearly_breakdown[year] = yearly_breakdown.get(year, 0) + 1
-
-        if total_genes == 0:
-            results = {"error": "No valid dates found in the specified range."}
-        else:
-            results = {
-                "total_genes": total_genes,
-                "earliest_date": earliest_date.strftime("%m/%d/%Y") if earliest_date else None,
-                "latest_date": latest_date.strftime("%m/%d/%Y") if latest_date else None,
-                "yearly_breakdown": yearly_breakdown
-            }
+            logging.error(f"Consumer {consumer.name} exited with code {consumer.exitcode}, starting a new one.")
+            stop.wait(1)
+            if not stop.is_set():
+                consumer = start_consumer(i)
+                consumers[consumer.sentinel] = (i, consumer)
 
-        save_results(jid, json.dumps(results, indent=2, sort_keys=True))
-        update_job_status(jid, "complete")
-        logging.info(f"Job {jid} complete. Processed {total_genes} genes.")
+def _stop_on_signals(stop) -> None:
+    """Set stop on SIGTERM or SIGINT, so the jobs in flight finish before the process exits."""
+    def request_stop(signum, frame):
+        if not stop.is_set():
+            logging.info(f"Received signal {signum}, finishing in-flight jobs before exiting...")
+        stop.set()
 
-    except Exception as e:
-        logging.error(f"Error processing job {jid}: {str(e)}")
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+def _run_consumer(stop) -> None:
+    """Entry point of a consumer process, which does not inherit the worker's signal handlers."""
+    _stop_on_signals(stop)
+    consume(stop)
+
+def _serve_metrics() -> None:
+    """Serve the worker's metrics on WORKER_METRICS_PORT, unless it is 0."""
+    if WORKER_METRICS_PORT:
+        start_http_server(WORKER_METRICS_PORT, registry=metrics_registry(q))
+        logging.info(f"Serving worker metrics on port {WORKER_METRICS_PORT}.")
+
+def main() -> None:
+    """Run WORKER_CONCURRENCY consumer processes and stop them gracefully on SIGTERM or SIGINT."""
+    # Consumers are forked by a single-threaded forkserver process rather than by this one: a child
+    # forked while the metrics server thread holds a lock (e.g. during a scrape) could deadlock on it
+    ctx = multiprocessing.get_context("forkserver")
+    stop = ctx.Event()
+    _stop_on_signals(stop)
+    logging.info(f"Worker started with {WORKER_CONCURRENCY} consumer(s). Waiting for jobs...")
+    if WORKER_CONCURRENCY <= 1:
+        _serve_metrics()
+        consume(stop)
+        return
+
+    def start_consumer(i: int) -> multiprocessing.Process:
+        consumer = ctx.Process(target=_run_consumer, args=(stop,), name=f"consumer-{i}")
+        consumer.start()
+        return consumer
+
+    # The metrics server starts once the first consumers (and the forkserver) are running
+    supervise(start_consumer, WORKER_CONCURRENCY, stop, started=_serve_metrics)
+    logging.info("All consumers stopped.")
 
 if __name__ == "__main__":
-    logging.info("Worker started. Waiting for jobs...")
-    process_job()
+    main()
@@ -1,3 +1,5 @@
+import random
+import pytest
 import requests
 import json
 
@@ -39,14 +41,16 @@ def test_get_specific_gene():
         assert response.status_code == 404
 
 def test_create_job():
-    payload = {"hgnc_id_start": "HGNC:6", "hgnc_id_end": "HGNC:12345"}
+    # A range no earlier run has used, so the job is new rather than an earlier identical one
+    start = random.randrange(10**6, 10**9)
+    payload = {"hgnc_id_start": f"HGNC:{start}", "hgnc_id_end": f"HGNC:{start + 12339}"}
     response = requests.post(f"{BASE_URL}/jobs", json=payload)
     assert response.status_code == 201
     job = response.json()
     assert "id" in job
     assert job["status"] == "submitted"
-    assert job["hgnc_id_start"] == "HGNC:6"
-    assert job["hgnc_id_end"] == "HGNC:12345"
+    assert job["hgnc_id_start"] == payload["hgnc_id_start"]
+    assert job["hgnc_id_end"] == payload["hgnc_id_end"]
     assert isinstance(job["id"], str) and len(job["id"]) > 0
 
 def test_list_jobs():
@@ -56,6 +60,32 @@ def test_list_jobs():
     assert "jobs" in jobs_data
     assert isinstance(jobs_data["jobs"], list)
 
+def test_list_jobs_by_status_with_pagination():
+    from jobs import add_job, update_job_status
+    jids = [add_job(f"HGNC:{n}", f"HGNC:{n}", cache_ttl=0)["id"] for n in (950001, 950002, 950003)]
+    for jid in jids:
+        update_job_status(jid, "complete")
+    listed = []
+    cursor = None
+    while True:
+        params = {"status": "complete", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{BASE_URL}/jobs", params=params)
+        assert response.status_code == 200
+        page = response.json()["jobs"]
+        assert len(page) <= 2
+        listed.extend(page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert listed[-3:] == jids
+    submitted = requests.get(f"{BASE_URL}/jobs", params={"status": "submitted"}).json()["jobs"]
+    assert not set(jids) & set(submitted)
+    assert requests.get(f"{BASE_URL}/jobs", params={"status": "lost"}).status_code == 400
+    for cursor in ("abc", "nan", "inf", "-inf"):
+        assert requests.get(f"{BASE_URL}/jobs", params={"cursor": cursor, "limit": 2}).status_code == 400
+
 def test_get_invalid_job():
     response = requests.get(f"{BASE_URL}/jobs/invalid-job-id")
     assert response.status_code == 404
@@ -67,3 +97,308 @@ def test_get_results_pending():
     job_id = job["id"]
     results_response = requests.get(f"{BASE_URL}/results/{job_id}")
     assert results_response.status_code in (202, 200)
+
+def test_load_data_to_redis_in_chunks():
+    from api import load_data_to_redis, rd
+    genes = [{"hgnc_id": f"HGNC:{n}", "symbol": f"TEST{n}"} for n in range(900001, 900006)]
+    genes[0]["date_approved_reserved"] = "1989-06-30"
+    genes.append({"symbol": "NO_ID"})
+    assert load_data_to_redis(genes, chunk_size=2) == 5
+    response = requests.get(f"{BASE_URL}/genes/HGNC:900003")
+    assert response.status_code == 200
+    assert response.json()["symbol"] == "TEST900003"
+    from jobs import GENE_INDEX_KEY, GENE_DATES_KEY
+    assert rd.zrangebyscore(GENE_INDEX_KEY, 900002, 900004) == [b"HGNC:900002", b"HGNC:900003", b"HGNC:900004"]
+    assert rd.hmget(GENE_DATES_KEY, ["HGNC:900001", "HGNC:900002"]) == [b"726283", None]
+    rd.delete(*[f"gene:HGNC:{n}" for n in range(900001, 900006)])
+    rd.hdel(GENE_DATES_KEY, *[f"HGNC:{n}" for n in range(900001, 900006)])
+    rd.zrem(GENE_INDEX_KEY, *[f"HGNC:{n}" for n in range(900001, 900006)])
+
+def test_reload_without_date_clears_date_column():
+    from api import load_data_to_redis, rd
+    from jobs import GENE_INDEX_KEY, GENE_DATES_KEY
+    try:
+        load_data_to_redis([{"hgnc_id": "HGNC:900011", "date_approved_reserved": "1990-01-01"}])
+        assert rd.hexists(GENE_DATES_KEY, "HGNC:900011")
+        load_data_to_redis([{"hgnc_id": "HGNC:900011", "date_approved_reserved": ""}])
+        assert not rd.hexists(GENE_DATES_KEY, "HGNC:900011")
+    finally:
+        rd.delete("gene:HGNC:900011")
+        rd.zrem(GENE_INDEX_KEY, "HGNC:900011")
+        rd.hdel(GENE_DATES_KEY, "HGNC:900011")
+
+def test_fetch_hgnc_data_streams_local_file(tmp_path):
+    from api import fetch_hgnc_data
+    docs = [{"hgnc_id": "HGNC:5", "symbol": "A1BG"}, {"hgnc_id": "HGNC:37133", "symbol": "A1BG-AS1"}]
+    wrapped = tmp_path / "hgnc_complete_set.json"
+    wrapped.write_text(json.dumps({"responseHeader": {}, "response": {"numFound": 2, "docs": docs}}))
+    bare = tmp_path / "docs.json"
+    bare.write_text(json.dumps(docs))
+    assert list(fetch_hgnc_data(str(wrapped))) == docs
+    assert list(fetch_hgnc_data(str(bare))) == docs
+
+def test_fetch_hgnc_data_stops_on_interrupted_download(tmp_path):
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from api import fetch_hgnc_data
+    docs = [{"hgnc_id": "HGNC:5", "symbol": "A1BG"}, {"hgnc_id": "HGNC:37133", "symbol": "A1BG-AS1"}]
+    body = json.dumps(docs).encode()
+    cut = body.index(b"}") + 2
+
+    class Truncated(BaseHTTPRequestHandler):
+        def do_GET(self):
+            # Promise the whole body, send part of it and drop the connection
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:cut])
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Truncated)
+    threading.Thread(target=server.handle_request, daemon=True).start()
+    try:
+        # The parser reads ahead, so the records before the break may or may not come through
+        fetched = list(fetch_hgnc_data(f"http://127.0.0.1:{server.server_port}/hgnc.json"))
+        assert fetched == docs[:len(fetched)]
+    finally:
+        server.server_close()
+    truncated = tmp_path / "truncated.json"
+    truncated.write_bytes(body[:cut])
+    assert list(fetch_hgnc_data(str(truncated))) == docs[:1]
+
+def test_json_array_streams_batches():
+    from api import _json_array
+    chunks = list(_json_array([[b'{"a": 1}', b'{"b": 2}'], [], [b'{"c": 3}']]))
+    assert chunks == [b"[", b'{"a": 1},{"b": 2}', b',{"c": 3}', b"]"]
+    assert json.loads(b"".join(chunks)) == [{"a": 1}, {"b": 2}, {"c": 3}]
+    assert b"".join(_json_array([])) == b"[]"
+
+def test_pagination_and_projection():
+    from api import load_data_to_redis, rd
+    from jobs import GENE_INDEX_KEY, GENE_DATES_KEY
+    ids = [f"HGNC:{n}" for n in range(910001, 910006)]
+    load_data_to_redis([{"hgnc_id": gid, "symbol": f"PAGE{i}", "name": "paged gene"} for i, gid in enumerate(ids)])
+
+    response = requests.get(f"{BASE_URL}/genes", params={"cursor": 910000, "limit": 2})
+    assert response.status_code == 200
+    assert response.json() == ids[:2]
+    assert response.headers["X-Next-Cursor"] == "910002"
+
+    response = requests.get(f"{BASE_URL}/data", params={"cursor": 910002, "limit": 2, "fields": "symbol"})
+    assert response.status_code == 200
+    assert response.json() == [{"symbol": "PAGE2"}, {"symbol": "PAGE3"}]
+
+    response = requests.get(f"{BASE_URL}/genes", params={"cursor": 910004, "fields": "symbol,missing"})
+    assert response.json() == [{"hgnc_id": "HGNC:910005", "symbol": "PAGE4"}]
+    assert "X-Next-Cursor" not in response.headers
+
+    assert requests.get(f"{BASE_URL}/data", params={"limit": 0}).status_code == 400
+    assert requests.get(f"{BASE_URL}/genes", params={"cursor": "HGNC:5"}).status_code == 400
+
+    rd.delete(*["gene:" + gid for gid in ids])
+    rd.zrem(GENE_INDEX_KEY, *ids)
+
+def test_get_gene_cache_invalidated_on_reload():
+    from api import load_data_to_redis, rd
+    from jobs import GENE_INDEX_KEY
+    load_data_to_redis([{"hgnc_id": "HGNC:920001", "symbol": "OLD"}])
+    first = requests.get(f"{BASE_URL}/genes/HGNC:920001")
+    second = requests.get(f"{BASE_URL}/genes/HGNC:920001")
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json()["symbol"] == "OLD"
+
+    load_data_to_redis([{"hgnc_id": "HGNC:920001", "symbol": "NEW"}])
+    reloaded = requests.get(f"{BASE_URL}/genes/HGNC:920001")
+    assert reloaded.headers["X-Cache"] == "MISS"
+    assert reloaded.json()["symbol"] == "NEW"
+    rd.delete("gene:HGNC:920001")
+    rd.zrem(GENE_INDEX_KEY, "HGNC:920001")
+
+def test_failed_load_still_invalidates_cached_genes():
+    from api import load_data_to_redis, bump_dataset_version, rd
+    from date_index import build_date_index, get_date_index
+    from jobs import GENE_INDEX_KEY, GENE_DATES_KEY
+    load_data_to_redis([{"hgnc_id": "HGNC:920002", "symbol": "OLD", "date_approved_reserved": "1990-01-01"}])
+    cached = requests.get(f"{BASE_URL}/genes/HGNC:920002")
+    requests.get(f"{BASE_URL}/genes/HGNC:920002")
+
+    def interrupted():
+        yield {"hgnc_id": "HGNC:920002", "symbol": "NEW", "date_approved_reserved": "1991-01-01"}
+        raise IOError("connection dropped")
+
+    try:
+        with pytest.raises(IOError):
+            load_data_to_redis(interrupted(), chunk_size=1)
+        reloaded = requests.get(f"{BASE_URL}/genes/HGNC:920002")
+        assert reloaded.headers["X-Cache"] == "MISS"
+        assert reloaded.json()["symbol"] == "NEW"
+        assert requests.get(f"{BASE_URL}/genes/HGNC:920002",
+                            headers={"If-None-Match": cached.headers["ETag"]}).status_code == 200
+        assert get_date_index(rd).summarize(920002, 920002)["yearly_breakdown"] == {1991: 1}
+    finally:
+        rd.delete("gene:HGNC:920002")
+        rd.zrem(GENE_INDEX_KEY, "HGNC:920002")
+        rd.hdel(GENE_DATES_KEY, "HGNC:920002")
+        build_date_index(rd, bump_dataset_version())
+
+def test_conditional_get_on_genes_and_data():
+    for path in ("/genes", "/data?limit=5", "/genes/HGNC:5"):
+        response = requests.get(f"{BASE_URL}{path}")
+        if response.status_code != 200:
+            continue
+        etag = response.headers["ETag"]
+        repeat = requests.get(f"{BASE_URL}{path}", headers={"If-None-Match": etag})
+        assert repeat.status_code == 304
+        assert repeat.content == b""
+        assert requests.get(f"{BASE_URL}{path}", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+def test_gene_batches_page_through_index(monkeypatch):
+    import fakeredis
+    import api
+    from codec import encode_gene
+    from jobs import GENE_INDEX_KEY
+    fake = fakeredis.FakeRedis()
+    ids = [f"HGNC:{n}" for n in (7, 3, 12, 5, 9)]
+    fake.mset({"gene:" + gid: encode_gene({"hgnc_id": gid}) for gid in ids})
+    fake.zadd(GENE_INDEX_KEY, {gid: int(gid.split(":")[1]) for gid in ids})
+    monkeypatch.setattr(api, "rd", fake)
+    batches = list(api._gene_batches(batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [json.loads(value)["hgnc_id"] for batch in batches for value in batch] == \
+        ["HGNC:3", "HGNC:5", "HGNC:7", "HGNC:9", "HGNC:12"]
+
+def test_etag_is_per_resource():
+    from api import app, rd
+    from codec import encode_gene
+    genes = {f"HGNC:{n}": {"hgnc_id": f"HGNC:{n}"} for n in (970001, 970002)}
+    rd.mset({"gene:" + gid: encode_gene(gene) for gid, gene in genes.items()})
+    client = app.test_client()
+    etag = client.get("/genes/HGNC:970001").headers["ETag"]
+    assert client.get("/genes/HGNC:970001", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/genes/HGNC:970002", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/genes/HGNC:970002", headers={"If-None-Match": "*"}).status_code == 304
+    assert client.get("/genes/HGNC:970003", headers={"If-None-Match": "*"}).status_code == 404
+    rd.delete(*["gene:" + gid for gid in genes])
+
+def test_conditional_get_on_results():
+    from jobs import add_job, update_job_status, save_results
+    job = add_job("HGNC:1", "HGNC:2")
+    update_job_status(job["id"], "complete")
+    save_results(job["id"], json.dumps({"total_genes": 1}))
+    response = requests.get(f"{BASE_URL}/results/{job['id']}")
+    assert response.status_code == 200
+    repeat = requests.get(f"{BASE_URL}/results/{job['id']}", headers={"If-None-Match": response.headers["ETag"]})
+    assert repeat.status_code == 304
+
+def test_job_events_stream_until_complete():
+    import threading
+    import time
+    from jobs import add_job, update_job_progress, update_job_status
+    job = add_job("HGNC:960001", "HGNC:960002", cache_ttl=0)
+
+    def run_job():
+        time.sleep(0.5)
+        update_job_progress(job["id"], 1, 2)
+        update_job_status(job["id"], "complete")
+
+    threading.Thread(target=run_job).start()
+    response = requests.get(f"{BASE_URL}/jobs/{job['id']}/events", stream=True, timeout=10)
+    assert response.headers["Content-Type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in response.iter_lines(decode_unicode=True) if line.startswith("data: ")]
+    assert events[0]["id"] == job["id"] and events[0]["status"] == "submitted"
+    assert {"id": job["id"], "processed": 1, "total": 2} in events
+    assert events[-1]["status"] == "complete"
+    assert requests.get(f"{BASE_URL}/jobs/no-such-job/events").status_code == 404
+
+def test_long_poll_returns_when_job_completes():
+    import threading
+    import time
+    from jobs import add_job, update_job_status, save_results
+    job = add_job("HGNC:970001", "HGNC:970002", cache_ttl=0)
+
+    def finish_job():
+        time.sleep(0.5)
+        save_results(job["id"], json.dumps({"total_genes": 0}))
+        update_job_status(job["id"], "complete")
+
+    threading.Thread(target=finish_job).start()
+    started = time.monotonic()
+    response = requests.get(f"{BASE_URL}/results/{job['id']}", params={"wait": 30})
+    assert response.status_code == 200
+    assert response.json() == {"total_genes": 0}
+    assert time.monotonic() - started < 10
+
+    response = requests.get(f"{BASE_URL}/jobs/{job['id']}", params={"wait": 30})
+    assert response.json()["status"] == "complete"
+    pending = add_job("HGNC:970003", "HGNC:970004", cache_ttl=0)
+    response = requests.get(f"{BASE_URL}/jobs/{pending['id']}", params={"wait": 0.5})
+    assert response.json()["status"] == "submitted"
+    assert requests.get(f"{BASE_URL}/jobs/{job['id']}", params={"wait": "soon"}).status_code == 400
+
+def test_sync_job_answered_from_range_index():
+    from api import load_data_to_redis, bump_dataset_version, rd
+    from date_index import build_date_index
+    from jobs import GENE_INDEX_KEY, GENE_DATES_KEY
+    ids = [f"HGNC:{n}" for n in (980001, 980002, 980005)]
+    dates = ["1986-01-01", "1999-05-02", "1999-07-03"]
+    try:
+        load_data_to_redis([{"hgnc_id": gid, "date_approved_reserved": d} for gid, d in zip(ids, dates)])
+        payload = {"hgnc_id_start": "HGNC:980001", "hgnc_id_end": "HGNC:980004"}
+        response = requests.post(f"{BASE_URL}/jobs", params={"sync": "true"}, json=payload)
+        assert response.status_code == 201
+        job = response.json()
+        assert job["status"] == "complete"
+        results = requests.get(f"{BASE_URL}/results/{job['id']}").json()
+        assert results == {"earliest_date": "01/01/1986", "latest_date": "05/02/1999", "total_genes": 2,
+                           "yearly_breakdown": {"1986": 1, "1999": 1}}
+    finally:
+        rd.delete(*["gene:" + gid for gid in ids])
+        rd.zrem(GENE_INDEX_KEY, *ids)
+        rd.hdel(GENE_DATES_KEY, *ids)
+        # Leave no trace of the test genes in the range index or in anything cached for this version
+        build_date_index(rd, bump_dataset_version())
+
+def test_metrics():
+    requests.get(f"{BASE_URL}/jobs")
+    requests.get(f"{BASE_URL}/genes/HGNC:5")
+    response = requests.get(f"{BASE_URL}/metrics")
+    assert response.status_code == 200
+    assert 'gene_cache_lookups_total{result="miss"}' in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/jobs",status="200"}' in response.text
+    assert "redis_command_duration_seconds" in response.text
+    assert "job_queue_depth" in response.text
+
+def test_profiled_request(monkeypatch):
+    import profiling
+    from api import app
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_MIN_INTERVAL", 0)
+    client = app.test_client()
+    assert "X-Request-ID" not in client.get("/jobs").headers
+    response = client.get("/jobs", headers={"X-Profile": "true"})
+    response.close()
+    request_id = response.headers["X-Request-ID"]
+    report = client.get(f"/profiles/{request_id}")
+    assert report.status_code == 200
+    assert report.get_data(as_text=True).startswith("GET /jobs -> 200 in ")
+    assert "list_jobs" in report.get_data(as_text=True)
+    assert client.get("/profiles/no-such-request").status_code == 404
+
+def test_profiler_released_without_after_request(monkeypatch):
+    import profiling
+    from api import app
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_MIN_INTERVAL", 0)
+    # An exception that propagates skips after_request; teardown must still stop the profiler
+    with app.test_request_context("/jobs?profile=true"):
+        app.preprocess_request()
+        assert profiling._profile_lock.locked()
+        app.do_teardown_request(RuntimeError("boom"))
+    assert not profiling._profile_lock.locked()
+    # Streamed responses are never profiled
+    response = app.test_client().get("/jobs/no-such-job/events", headers={"X-Profile": "true"})
+    assert "X-Request-ID" not in response.headers
+    assert not profiling._profile_lock.locked()
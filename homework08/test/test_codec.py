@@ -0,0 +1,33 @@
+import json
+import pytest
+from codec import encode_gene, decode_gene, decode_genes, to_json_bytes
+
+GENE = {
+    "hgnc_id": "HGNC:5",
+    "symbol": "A1BG",
+    "name": "alpha-1-B glycoprotein",
+    "alias_symbol": [],
+    "date_approved_reserved": "1989-06-30",
+    "uniprot_ids": ["P04217"],
+}
+
+def test_round_trip_each_codec():
+    for codec in ("json", "zlib", "msgpack+zlib"):
+        assert decode_gene(encode_gene(GENE, codec)) == GENE
+
+def test_legacy_json_records_still_decode():
+    legacy = json.dumps(GENE).encode("utf-8")
+    assert decode_gene(legacy) == GENE
+    assert to_json_bytes(legacy) is legacy
+
+def test_decode_genes_mixed_batch():
+    values = [json.dumps(GENE).encode("utf-8"), encode_gene(GENE, "zlib"), encode_gene(GENE, "msgpack+zlib")]
+    assert decode_genes(values) == [GENE, GENE, GENE]
+    assert decode_genes(values[:1] * 2) == [GENE, GENE]
+
+def test_to_json_bytes_decodes_encoded_records():
+    assert json.loads(to_json_bytes(encode_gene(GENE, "msgpack+zlib"))) == GENE
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        encode_gene(GENE, "gzip")
@@ -0,0 +1,29 @@
+import random
+from datetime import date
+from date_index import DateIndex, index_fields
+from dates import partial_summary
+
+def make_index(genes: list) -> DateIndex:
+    fields = index_fields(genes, "7")
+    return DateIndex({key.encode(): value.encode() if isinstance(value, str) else value for key, value in fields.items()})
+
+def test_summarize_matches_scan():
+    rng = random.Random(332)
+    numbers = sorted(rng.sample(range(1, 5000), 700))
+    genes = [(n, date(rng.randint(1986, 2024), rng.randint(1, 12), rng.randint(1, 28)).toordinal()) for n in numbers]
+    index = make_index(genes)
+    assert index.version == "7"
+    for _ in range(200):
+        start, end = sorted(rng.sample(range(0, 5001), 2))
+        expected = partial_summary(ordinal for n, ordinal in genes if start <= n <= end)
+        assert index.summarize(start, end) == expected
+
+def test_summarize_empty_range():
+    index = make_index([(5, date(1989, 6, 30).toordinal())])
+    assert index.summarize(6, 10)["total_genes"] == 0
+    assert index.summarize(5, 5)["yearly_breakdown"] == {1989: 1}
+
+def test_index_arrays_are_little_endian():
+    from date_index import _pack, _unpack
+    assert _pack([1, 256]) == b"\x01\x00\x00\x00\x00\x01\x00\x00"
+    assert list(_unpack(_pack([7, -3]))) == [7, -3]
@@ -1,6 +1,6 @@
 import pytest
 import json
-from jobs import add_job, get_job_by_id, save_results, get_results
+from jobs import add_job, get_job_by_id, save_results, get_results, get_results_etag
 
 def test_add_job_and_retrieve():
     job = add_job("HGNC:6", "HGNC:12345")
@@ -10,6 +10,66 @@ def test_add_job_and_retrieve():
     assert retrieved is not None
     assert retrieved["id"] == jid
 
+def test_update_job_status_records_timestamps():
+    from jobs import update_job_status, jdb
+    job = add_job("HGNC:1", "HGNC:3", cache_ttl=0)
+    assert "submitted_at" in job
+    update_job_status(job["id"], "in progress")
+    started = get_job_by_id(job["id"])
+    assert started["status"] == "in progress" and "started_at" in started
+    update_job_status(job["id"], "complete")
+    finished = get_job_by_id(job["id"])
+    assert finished["status"] == "complete"
+    assert finished["started_at"] == started["started_at"]
+    assert finished["finished_at"] >= finished["started_at"] >= finished["submitted_at"]
+    with pytest.raises(Exception):
+        update_job_status("no-such-job", "complete")
+    assert not jdb.exists("no-such-job")
+
+def test_legacy_string_job_is_converted_and_can_complete():
+    from jobs import update_job_status, jdb, _status_key
+    jid = "legacy-job-017"
+    jdb.delete(jid)
+    jdb.set(jid, json.dumps({"id": jid, "status": "submitted", "hgnc_id_start": "HGNC:1", "hgnc_id_end": "HGNC:3"}),
+            ex=600)
+    try:
+        assert update_job_status(jid, "in progress")
+        assert jdb.type(jid) == b"hash"
+        assert 0 < jdb.ttl(jid) <= 600
+        assert update_job_status(jid, "complete")
+        job = get_job_by_id(jid)
+        assert job["status"] == "complete" and job["hgnc_id_end"] == "HGNC:3" and "finished_at" in job
+        jdb.delete(jid)
+        jdb.set(jid, json.dumps({"id": jid, "status": "submitted", "hgnc_id_start": "HGNC:1", "hgnc_id_end": "HGNC:3"}))
+        assert get_job_by_id(jid)["status"] == "submitted"
+        assert jdb.type(jid) == b"hash"
+    finally:
+        jdb.delete(jid)
+        jdb.zrem(_status_key("complete"), jid)
+
+def test_job_bookkeeping_round_trips(monkeypatch):
+    import redis.connection
+    from jobs import q, update_job_status
+    monkeypatch.setattr(q, "put", lambda *jids: None)
+    sent = []
+    send = redis.connection.Connection.send_packed_command
+    monkeypatch.setattr(redis.connection.Connection, "send_packed_command",
+                        lambda self, *args, **kwargs: sent.append(1) or send(self, *args, **kwargs))
+    job = add_job("HGNC:943001", "HGNC:943009")
+    # The dataset version, then saving, claiming the cache key and listing in one pipeline
+    assert len(sent) == 2
+    sent.clear()
+    assert update_job_status(job["id"], "in progress")
+    assert len(sent) == 1
+
+def test_add_job_prunes_expired_listing_entries():
+    from jobs import jdb, JOBS_INDEX_KEY, _status_key
+    for key in (JOBS_INDEX_KEY, _status_key("complete")):
+        jdb.zadd(key, {"long-expired-job": 1})
+    add_job("HGNC:1", "HGNC:3", cache_ttl=0)
+    assert jdb.zscore(JOBS_INDEX_KEY, "long-expired-job") is None
+    assert jdb.zscore(_status_key("complete"), "long-expired-job") is None
+
 def test_save_and_get_results():
     test_id = "test-job-123"
     sample_results = {
@@ -23,3 +83,146 @@ def test_save_and_get_results():
     ret = get_results(test_id)
     assert ret is not None
     assert json.loads(ret) == sample_results
+    assert get_results_etag(test_id) is not None
+    assert get_results_etag("no-such-job") is None
+
+def test_shard_ranges():
+    from jobs import _shard_ranges
+    assert _shard_ranges("HGNC:1", "HGNC:10", 0) == [("HGNC:1", "HGNC:10")]
+    assert _shard_ranges("HGNC:1", "HGNC:10", 10) == [("HGNC:1", "HGNC:10")]
+    assert _shard_ranges("HGNC:1", "HGNC:10", 4) == [("HGNC:1", "HGNC:4"), ("HGNC:5", "HGNC:8"), ("HGNC:9", "HGNC:10")]
+
+def test_sharded_job_merges_partial_results(monkeypatch):
+    from datetime import date
+    from jobs import rd, rdb, q, GENE_INDEX_KEY, GENE_DATES_KEY
+    import worker
+    from worker import process_job
+    monkeypatch.setattr(worker, "get_date_index", lambda rd: None)
+    genes = {"HGNC:930001": date(1986, 1, 1), "HGNC:930004": date(1999, 5, 2), "HGNC:930007": date(1999, 7, 3)}
+    rd.zadd(GENE_INDEX_KEY, {gid: int(gid.split(":")[1]) for gid in genes})
+    rd.hset(GENE_DATES_KEY, mapping={gid: d.toordinal() for gid, d in genes.items()})
+    queued = []
+    monkeypatch.setattr(q, "put", lambda *jids: queued.extend(jids))
+    job = add_job("HGNC:930001", "HGNC:930008", shard_size=3, cache_ttl=0)
+    assert job["shards"] == 3 and len(queued) == 3
+    assert job["total"] == 3 and job["processed"] == 0
+    process_job(queued[-1])
+    assert get_job_by_id(job["id"])["processed"] == 1
+    for jid in reversed(queued[:-1]):
+        process_job(jid)
+    finished = get_job_by_id(job["id"])
+    assert finished["status"] == "complete" and finished["processed"] == finished["total"] == 3
+    assert json.loads(get_results(job["id"])) == {
+        "total_genes": 3,
+        "earliest_date": "01/01/1986",
+        "latest_date": "07/03/1999",
+        "yearly_breakdown": {"1986": 1, "1999": 2}
+    }
+    # A shard delivered again after the merge leaves the finished job alone
+    process_job(queued[0])
+    assert get_job_by_id(job["id"])["status"] == "complete"
+    assert not rdb.exists(f"partials:{job['id']}")
+    rd.zrem(GENE_INDEX_KEY, *genes)
+    rd.hdel(GENE_DATES_KEY, *genes)
+
+def test_identical_jobs_share_one_job(monkeypatch):
+    from jobs import q, jdb, job_cache_key, forget_cached_job
+    queued = []
+    monkeypatch.setattr(q, "put", lambda *jids: queued.extend(jids))
+    jdb.delete(job_cache_key("HGNC:940001", "HGNC:940009"))
+    first = add_job("HGNC:940001", "HGNC:940009")
+    again = add_job("HGNC:0940001", "HGNC:940009")
+    assert again["id"] == first["id"]
+    assert queued == [first["id"]]
+    forget_cached_job(first)
+    assert add_job("HGNC:940001", "HGNC:940009")["id"] != first["id"]
+    assert len(queued) == 2
+
+def test_concurrent_identical_jobs_share_one_job(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from jobs import q, jdb, job_cache_key
+    queued = []
+    monkeypatch.setattr(q, "put", lambda *jids: queued.extend(jids))
+    jdb.delete(job_cache_key("HGNC:941001", "HGNC:941009"))
+    with ThreadPoolExecutor(8) as pool:
+        jobs = list(pool.map(lambda _: add_job("HGNC:941001", "HGNC:941009"), range(32)))
+    assert len({job["id"] for job in jobs}) == 1
+    assert queued == [jobs[0]["id"]]
+
+def test_stalled_job_is_not_reused(monkeypatch):
+    import jobs
+    queued = []
+    monkeypatch.setattr(jobs.q, "put", lambda *jids: queued.extend(jids))
+    jobs.jdb.delete(jobs.job_cache_key("HGNC:942001", "HGNC:942009"))
+    first = add_job("HGNC:942001", "HGNC:942009")
+    monkeypatch.setattr(jobs, "JOB_STALL_TIMEOUT", 0)
+    assert add_job("HGNC:942001", "HGNC:942009")["id"] != first["id"]
+    assert len(queued) == 2
+
+def test_normalize_analysis():
+    from jobs import normalize_analysis, DEFAULT_ANALYSIS, DEFAULT_TOP_K
+    assert normalize_analysis(None) == DEFAULT_ANALYSIS
+    assert normalize_analysis({"field": "status", "aggregation": "top_k"})["k"] == DEFAULT_TOP_K
+    for bad in ({"field": "status"}, {"aggregation": "count_by"}, {"field": "status", "aggregation": "top_k", "k": 0}, "status"):
+        with pytest.raises(ValueError):
+            normalize_analysis(bad)
+
+def test_analysis_job_runs_over_gene_records(monkeypatch):
+    from jobs import q, rd, GENE_INDEX_KEY
+    from codec import encode_gene
+    from worker import process_job
+    genes = {f"HGNC:{n}": {"hgnc_id": f"HGNC:{n}", "locus_group": group}
+             for n, group in ((931001, "pseudogene"), (931002, "pseudogene"), (931003, "non-coding RNA"))}
+    rd.mset({"gene:" + gid: encode_gene(gene) for gid, gene in genes.items()})
+    rd.zadd(GENE_INDEX_KEY, {gid: int(gid.split(":")[1]) for gid in genes})
+    queued = []
+    monkeypatch.setattr(q, "put", lambda *jids: queued.extend(jids))
+    analysis = {"field": "locus_group", "aggregation": "count_by"}
+    job = add_job("HGNC:931001", "HGNC:931003", shard_size=2, cache_ttl=0, analysis=analysis)
+    assert get_job_by_id(job["id"])["analysis"] == analysis
+    for jid in queued:
+        process_job(jid)
+    assert json.loads(get_results(job["id"])) == {
+        "field": "locus_group", "total": 3, "counts": {"pseudogene": 2, "non-coding RNA": 1}
+    }
+    rd.delete(*["gene:" + gid for gid in genes])
+    rd.zrem(GENE_INDEX_KEY, *genes)
+
+def test_finished_job_never_moves_back():
+    from jobs import update_job_status
+    job = add_job("HGNC:1", "HGNC:3", cache_ttl=0)
+    assert update_job_status(job["id"], "complete")
+    assert not update_job_status(job["id"], "in progress")
+    assert get_job_by_id(job["id"])["status"] == "complete"
+
+def test_failed_shard_fails_its_job(monkeypatch):
+    from jobs import q, wait_for_job
+    import worker
+    queued = []
+    monkeypatch.setattr(q, "put", lambda *jids: queued.extend(jids))
+    monkeypatch.setattr(worker, "get_date_index", lambda rd: None)
+
+    def broken(start, end):
+        raise RuntimeError("gene index unavailable")
+
+    monkeypatch.setattr(worker, "get_hgnc_ids_in_range", broken)
+    job = add_job("HGNC:932001", "HGNC:932004", shard_size=2, cache_ttl=0)
+    worker.process_job(queued[0])
+    assert get_job_by_id(queued[0])["status"] == "failed"
+    failed = wait_for_job(job["id"], 5)
+    assert failed["status"] == "failed" and "finished_at" in failed
+    assert failed["error"] == "Shard 1/2 failed: gene index unavailable"
+    # The other shard is not run once its job has failed
+    worker.process_job(queued[1])
+    assert get_job_by_id(queued[1])["status"] == "submitted"
+
+def test_status_listing_keeps_submission_order():
+    from jobs import jdb, list_job_ids, update_job_status, JOBS_INDEX_KEY, _status_key
+    first = add_job("HGNC:943001", "HGNC:943001", cache_ttl=0)
+    second = add_job("HGNC:943002", "HGNC:943002", cache_ttl=0)
+    update_job_status(second["id"], "in progress")
+    update_job_status(first["id"], "in progress")
+    in_progress = _status_key("in progress")
+    assert jdb.zscore(in_progress, first["id"]) == jdb.zscore(JOBS_INDEX_KEY, first["id"])
+    ids, _ = list_job_ids("in progress")
+    assert ids.index(first["id"]) < ids.index(second["id"])
@@ -0,0 +1,34 @@
+import pytest
+from jobs import _redis_ip, _redis_port
+from reliable_queue import ReliableQueue
+
+@pytest.fixture
+def queue():
+    rq = ReliableQueue("test-reliable", visibility_timeout=60, host=_redis_ip, port=_redis_port, db=1)
+    yield rq
+    rq._redis.delete(rq.key, rq._consumers_key, rq._processing_key(rq.consumer), rq._heartbeat_key(rq.consumer))
+
+def test_get_keeps_job_in_flight_until_ack(queue):
+    queue.put("job-1", "job-2")
+    assert queue.get() == "job-1"
+    assert len(queue) == 1
+    assert queue._redis.lrange(queue._processing_key(queue.consumer), 0, -1) != []
+    queue.ack("job-1")
+    assert queue._redis.llen(queue._processing_key(queue.consumer)) == 0
+    assert queue.get(block=True, timeout=1) == "job-2"
+    assert queue.get(block=True, timeout=1) is None
+
+def test_requeue_expired(queue):
+    queue.heartbeat()
+    queue.put("job-1", "job-2")
+    assert queue.get() == "job-1"
+    assert queue.requeue_expired() == 0
+    queue._redis.delete(queue._heartbeat_key(queue.consumer))
+    assert queue.requeue_expired() == 1
+    assert queue.get() == "job-1"
+    assert queue.get() == "job-2"
+
+def test_consumer_id_is_unique_per_queue(queue):
+    other = ReliableQueue("test-reliable", host=_redis_ip, port=_redis_port, db=1)
+    assert queue.consumer == queue.consumer
+    assert other.consumer != queue.consumer
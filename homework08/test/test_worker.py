@@ -1,4 +1,5 @@
 import pytest
+import json
 from datetime import datetime
 from worker import parse_date, get_hgnc_ids_in_range
 
@@ -17,10 +18,244 @@ def test_parse_date_with_spaces():
     assert dt.month == 3
     assert dt.day == 1
 
+def test_parse_date_iso_format():
+    dt = parse_date("1989-06-30")
+    assert (dt.year, dt.month, dt.day) == (1989, 6, 30)
+    assert parse_date("1989-06-30") == parse_date("6/30/1989")
+
+def test_parse_date_invalid():
+    for date_str in ("2/30/2000", "1/1/89", "1989/06/30", "June 30, 1989", ""):
+        with pytest.raises(ValueError):
+            parse_date(date_str)
+
 def test_get_hgnc_ids_in_range(monkeypatch):
-    from jobs import rd
-    def fake_keys(pattern):
-        return [b"gene:HGNC:5", b"gene:HGNC:7", b"gene:HGNC:10"]
-    monkeypatch.setattr(rd, "keys", fake_keys)
+    from jobs import rd, GENE_INDEX_KEY
+    def fake_zrangebyscore(name, min, max):
+        assert name == GENE_INDEX_KEY
+        assert (min, max) == (5, 10)
+        return [b"HGNC:5", b"HGNC:7", b"HGNC:10"]
+    monkeypatch.setattr(rd, "zrangebyscore", fake_zrangebyscore)
     ids = get_hgnc_ids_in_range("HGNC:5", "HGNC:10")
-    assert set(ids) == {"HGNC:5", "HGNC:7", "HGNC:10"}
+    assert ids == ["HGNC:5", "HGNC:7", "HGNC:10"]
+
+def test_get_hgnc_ids_in_range_invalid_ids():
+    assert get_hgnc_ids_in_range("HGNC:abc", "HGNC:10") == []
+
+def test_fetch_genes_batches_mget(monkeypatch):
+    from jobs import rd
+    from worker import fetch_genes
+    store = {
+        "gene:HGNC:5": b'{"hgnc_id": "HGNC:5", "date_approved_reserved": "1989-06-30"}',
+        "gene:HGNC:7": b'{"hgnc_id": "HGNC:7", "date_approved_reserved": "1986-01-01"}',
+    }
+    calls = []
+    def fake_mget(keys):
+        calls.append(keys)
+        return [store.get(key) for key in keys]
+    monkeypatch.setattr(rd, "mget", fake_mget)
+    genes = list(fetch_genes(["HGNC:5", "HGNC:6", "HGNC:7"], batch_size=2))
+    assert calls == [["gene:HGNC:5", "gene:HGNC:6"], ["gene:HGNC:7"]]
+    assert [gid for gid, _ in genes] == ["HGNC:5", "HGNC:7"]
+    assert genes[1][1]["date_approved_reserved"] == "1986-01-01"
+
+def test_approval_ordinals_batches_hmget(monkeypatch):
+    from jobs import rd, GENE_DATES_KEY
+    from worker import approval_ordinals
+    column = {"HGNC:5": b"726283", "HGNC:10": b"725007"}
+    calls = []
+    def fake_hmget(name, keys):
+        assert name == GENE_DATES_KEY
+        calls.append(keys)
+        return [column.get(key) for key in keys]
+    monkeypatch.setattr(rd, "hmget", fake_hmget)
+    ordinals = list(approval_ordinals(["HGNC:5", "HGNC:7", "HGNC:10"], batch_size=2))
+    assert calls == [["HGNC:5", "HGNC:7"], ["HGNC:10"]]
+    assert ordinals == [726283, 725007]
+
+def test_summarize_dates():
+    from datetime import date
+    from worker import summarize_dates
+    ordinals = [date(1986, 1, 1).toordinal(), date(1989, 6, 30).toordinal(), date(1989, 12, 7).toordinal()]
+    results = summarize_dates(ordinals)
+    assert results == {
+        "total_genes": 3,
+        "earliest_date": "01/01/1986",
+        "latest_date": "12/07/1989",
+        "yearly_breakdown": {1986: 1, 1989: 2}
+    }
+    assert "error" in summarize_dates([])
+
+def test_merge_summaries():
+    from datetime import date
+    from worker import partial_summary, merge_summaries, finalize_summary, summarize_dates
+    ordinals = [date(1986, 1, 1).toordinal(), date(1989, 6, 30).toordinal(), date(1989, 12, 7).toordinal()]
+    partials = [partial_summary(ordinals[:1]), partial_summary([]), partial_summary(ordinals[1:])]
+    partials[2]["yearly_breakdown"] = {"1989": 2}
+    assert finalize_summary(merge_summaries(partials)) == summarize_dates(ordinals)
+    assert "error" in finalize_summary(merge_summaries([partial_summary([])]))
+
+def test_count_values_publishes_progress(monkeypatch):
+    import worker
+    updates = []
+    monkeypatch.setattr(worker, "update_job_progress", lambda *args, **kwargs: updates.append(args))
+    monkeypatch.setattr(worker, "JOB_PROGRESS_INTERVAL", 3600)
+    gene_ids = [f"HGNC:{n}" for n in range(5)]
+    counts = worker.count_values("job-1", gene_ids, lambda batch: [730000] * len(batch), batch_size=2)
+    assert counts == {730000: 5}
+    assert updates == [("job-1", 5, 5, None)]
+    monkeypatch.setattr(worker, "JOB_PROGRESS_INTERVAL", 0)
+    updates.clear()
+    worker.count_values("job-1", gene_ids, lambda batch: [730000] * len(batch), batch_size=2)
+    assert [processed for _, processed, _, _ in updates] == [2, 4, 5]
+
+def test_consume_processes_jobs_until_stopped(monkeypatch):
+    import threading
+    import worker
+    stop = threading.Event()
+    queued = ["job-1", None, "job-2"]
+    processed = []
+    def fake_get(block=False, timeout=None):
+        jid = queued.pop(0)
+        if not queued:
+            stop.set()
+        return jid
+    monkeypatch.setattr(worker.q, "get", fake_get)
+    monkeypatch.setattr(worker, "process_job", processed.append)
+    worker.consume(stop)
+    assert processed == ["job-1", "job-2"]
+
+def test_consume_retries_after_connection_error(monkeypatch):
+    import threading
+    import redis
+    import worker
+    stop = threading.Event()
+    queued = [redis.exceptions.ConnectionError("Connection refused"), "job-1"]
+    processed = []
+    def fake_get(block=False, timeout=None):
+        item = queued.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        stop.set()
+        return item
+    monkeypatch.setattr(worker.q, "get", fake_get)
+    monkeypatch.setattr(worker, "process_job", processed.append)
+    worker.consume(stop)
+    assert processed == ["job-1"]
+
+def test_supervise_replaces_crashed_consumers():
+    import multiprocessing
+    import sys
+    import worker
+    stop = multiprocessing.Event()
+    started = []
+    def start_consumer(i):
+        # The first consumer crashes; its replacement asks the worker to stop
+        started.append(i)
+        if len(started) == 1:
+            consumer = multiprocessing.Process(target=sys.exit, args=(3,))
+        else:
+            consumer = multiprocessing.Process(target=stop.set)
+        consumer.start()
+        return consumer
+    worker.supervise(start_consumer, 1, stop)
+    assert started == [0, 0]
+
+def test_analyses_merge_across_shards():
+    from collections import Counter
+    from worker import AGGREGATORS, field_values, finish_results
+    genes = [
+        {"locus_group": "protein-coding gene", "gene_group": ["A", "B"], "date_modified": "2020-01-02"},
+        {"locus_group": "pseudogene", "gene_group": ["A"], "date_modified": "1999-05-06"},
+        {"locus_group": "protein-coding gene", "date_modified": "not a date"},
+    ]
+    assert list(field_values(genes[0], "gene_group")) == ["A", "B"]
+    assert list(field_values(genes[2], "gene_group")) == []
+
+    def partial(analysis, shard):
+        values = [v for gene in shard for v in AGGREGATORS[analysis["aggregation"]].values(gene, analysis["field"])]
+        return {"counts": list(Counter(values).items())}
+
+    count_by = {"field": "gene_group", "aggregation": "count_by"}
+    assert finish_results(count_by, [partial(count_by, genes[:1]), partial(count_by, genes[1:])]) == {
+        "field": "gene_group", "total": 3, "counts": {"A": 2, "B": 1}
+    }
+    top_k = {"field": "locus_group", "aggregation": "top_k", "k": 1}
+    assert finish_results(top_k, [partial(top_k, genes)])["top"] == [{"value": "protein-coding gene", "count": 2}]
+    histogram = {"field": "date_modified", "aggregation": "date_histogram"}
+    results = finish_results(histogram, [partial(histogram, genes[:1]), partial(histogram, genes[1:])])
+    assert results["total_genes"] == 2 and results["yearly_breakdown"] == {2020: 1, 1999: 1}
+
+def test_process_jobs_shares_one_scan(monkeypatch):
+    from datetime import date
+    import worker
+    from jobs import add_job, get_results, q, rd, GENE_INDEX_KEY, GENE_DATES_KEY
+    monkeypatch.setattr(worker, "get_date_index", lambda rd: None)
+    monkeypatch.setattr(q, "put", lambda *jids: None)
+    genes = {f"HGNC:{n}": date(1990 + n % 5, 1, 1) for n in range(932001, 932011)}
+    rd.zadd(GENE_INDEX_KEY, {gid: int(gid.split(":")[1]) for gid in genes})
+    rd.hset(GENE_DATES_KEY, mapping={gid: d.toordinal() for gid, d in genes.items()})
+    ranges = [(932001, 932006), (932004, 932010), (932002, 932003)]
+    jobs = [add_job(f"HGNC:{start}", f"HGNC:{end}", cache_ttl=0) for start, end in ranges]
+    reads = []
+    real_hmget = rd.hmget
+    def counting_hmget(name, keys):
+        reads.extend(keys)
+        return real_hmget(name, keys)
+    monkeypatch.setattr(rd, "hmget", counting_hmget)
+    updates = []
+    monkeypatch.setattr(worker, "update_job_progress", lambda *args, **kwargs: updates.append(args))
+    monkeypatch.setattr(worker, "JOB_PROGRESS_INTERVAL", 3600)
+    worker.process_jobs([job["id"] for job in jobs])
+    assert sorted(reads) == sorted(genes)
+    assert sorted(updates) == sorted((job["id"], end - start + 1, end - start + 1, None)
+                                     for job, (start, end) in zip(jobs, ranges))
+    for job, (start, end) in zip(jobs, ranges):
+        expected = worker.summarize_dates(d.toordinal() for gid, d in genes.items() if start <= int(gid[5:]) <= end)
+        assert json.loads(get_results(job["id"])) == json.loads(json.dumps(expected))
+    rd.zrem(GENE_INDEX_KEY, *genes)
+    rd.hdel(GENE_DATES_KEY, *genes)
+
+def test_consume_drains_waiting_jobs(monkeypatch):
+    import threading
+    import worker
+    stop = threading.Event()
+    queued = ["job-1", "job-2", "job-3", None]
+    batches = []
+    def fake_get(block=False, timeout=None):
+        return queued.pop(0) if queued else None
+    monkeypatch.setattr(worker.q, "get", fake_get)
+    monkeypatch.setattr(worker, "_drain_limit", lambda: 2)
+    def fake_process_jobs(jids):
+        batches.append(jids)
+        if len(batches) == 2:
+            stop.set()
+    monkeypatch.setattr(worker, "process_jobs", fake_process_jobs)
+    worker.consume(stop)
+    assert batches == [["job-1", "job-2"], ["job-3"]]
+
+def test_drain_limit_spreads_jobs_over_consumers(monkeypatch):
+    import worker
+    monkeypatch.setattr(worker, "JOB_DRAIN_SIZE", 16)
+    monkeypatch.setattr(worker, "WORKER_CONCURRENCY", 4)
+    monkeypatch.setattr(worker, "q", ["job"] * 15)
+    assert worker._drain_limit() == 4
+    monkeypatch.setattr(worker, "q", [])
+    assert worker._drain_limit() == 1
+    monkeypatch.setattr(worker, "q", ["job"] * 100)
+    assert worker._drain_limit() == 16
+    monkeypatch.setattr(worker, "JOB_DRAIN_SIZE", 1)
+    assert worker._drain_limit() == 1
+
+def test_index_answered_jobs_leave_throughput_alone():
+    from prometheus_client import REGISTRY
+    from metrics import observe_job
+
+    def throughput():
+        return (REGISTRY.get_sample_value("job_genes_processed_total") or 0,
+                REGISTRY.get_sample_value("job_genes_per_second"))
+
+    before = throughput()
+    observe_job("date_histogram", 0.00004, 0)
+    assert throughput() == before
+    observe_job("date_histogram", 2.0, 1000)
+    assert throughput() == (before[0] + 1000, 500)